@@ -6,14 +6,265 @@ V2: Single audio generation, fast b-roll cuts, ASS word-by-word subtitles.
 """
 
 import argparse
+import hashlib
+import importlib
+import importlib.metadata
+import importlib.util
 import json
 import logging
+import logging.handlers
+import math
+import multiprocessing
 import os
+import queue
+import re
+import shutil
 import sys
 import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from functools import cache, cached_property, lru_cache, partial
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fastjsonschema
+except ImportError as e:
+    print(f"Error: Missing required package: {e}")
+    print("Install with: pip install fastjsonschema")
+    sys.exit(1)
+
+from scripts.fast_json import json_loads
+from scripts.media_headers import read_mp4_duration
+
+
+# Input config schema; compiled into a generated Python validator on first use
+CONFIG_SCHEMA_PATH = Path(__file__).resolve().parent / "config" / "config.schema.json"
+CONFIG_SCHEMA_BYTES = CONFIG_SCHEMA_PATH.read_bytes()
+
+# Validated configs are remembered by content hash (of schema + config), so
+# changing the schema invalidates old markers. Generated validator modules
+# are cached alongside, keyed by schema hash.
+CONFIG_CACHE_DIR = Path(__file__).resolve().parent / ".cache" / "config"
+
+# Legacy wording for enum violations on top-level fields
+_ENUM_FIELD_LABELS = {
+    'target_platform': 'platform',
+    'voice_name': 'voice',
+    'background_music_genre': 'genre',
+}
+
+SETTINGS_PATH = Path("config") / "settings.json"
+
+PROJECT_SUBDIRS = ("audio_segments", "broll", "subtitles")
+
+# Processed b-roll clips from earlier runs, keyed by everything that shapes them.
+# Entries expire with the fetcher's search cache (24h) so speed factors and
+# stock results don't stay frozen
+BROLL_CACHE_DIR = Path("generated_videos") / ".broll_cache"
+BROLL_CACHE_MAX_ENTRIES = 200
+BROLL_CACHE_TTL_HOURS = 24
+
+# Threads each broll_fetcher clip encode uses (its ENCODE_THREADS); sizes the
+# encode budget handed to the resident fetchers
+BROLL_ENCODE_THREADS = 2
+
+# Full narration + word timestamps, keyed by voice and script text
+TTS_CACHE_DIR = Path("generated_videos") / ".tts_cache"
+TTS_CACHE_MAX_ENTRIES = 50
+TTS_CACHE_FILES = ("full_audio.wav", "audio_timestamps.json")
+
+# audio_generator's defaults, used when kokoro_settings doesn't pick a backend
+# or timestamp model (both shape the cached narration)
+TTS_BACKEND = "pytorch"
+TTS_WHISPER_MODEL = "distil-small.en"
+
+# Incomplete runs are renamed to this prefix under generated_videos/, then deleted
+TRASH_PREFIX = ".trash_"
+
+SCRIPTS_DIR = Path(__file__).resolve().parent / "scripts"
+
+BANNER_RULE = "=" * 70
+
+# How often to look for new segment timings while audio generation runs
+TIMINGS_POLL_SECONDS = 0.25
+
+# Anything smaller cannot be a playable MP4 (ftyp + moov alone exceed this)
+MIN_VIDEO_BYTES = 1024
+
+# Lines of helper stderr kept for the error report when a helper fails
+STDERR_TAIL_LINES = 200
+
+PLATFORM_RESOLUTIONS = {
+    "youtube_shorts": "1080x1920",
+    "tiktok": "1080x1920",
+    "instagram_reels": "1080x1920",
+    "youtube_long": "1920x1080"
+}
+
+# Platforms that get the TikTok subtitle style; everything else uses youtube_shorts
+TIKTOK_STYLE_PLATFORMS = frozenset({"tiktok", "instagram_reels"})
+
+
+# Helper module preloaded by a pool worker (see _init_helper_worker)
+_helper_module = None
+
+
+def _init_helper_worker(module_name: str):
+    """Pool initializer: import a helper script once per worker process."""
+    global _helper_module
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    _helper_module = importlib.import_module(module_name)
+
+
+def _run_helper_main(args: List[str]) -> Tuple[int, str, List[str]]:
+    """Run the preloaded helper's main() in a pool worker.
+
+    Returns (exit code, stdout, stderr tail). For the call, the worker's fds 1/2
+    point at temp files, so output of the helper's ffmpeg children is captured
+    too, as run_helper_script's pipes would.
+    """
+    with tempfile.TemporaryFile('w+', encoding='utf-8', errors='replace') as out, \
+            tempfile.TemporaryFile('w+', encoding='utf-8', errors='replace') as err:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_fds = os.dup(1), os.dup(2)
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        try:
+            returncode = _helper_module.main(args)
+        except SystemExit as e:  # argparse usage errors
+            returncode = e.code if isinstance(e.code, int) else 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for fd, saved in zip((1, 2), saved_fds):
+                os.dup2(saved, fd)
+                os.close(saved)
+
+        out.seek(0)
+        err.seek(0)
+        return returncode, out.read(), list(deque(err, maxlen=STDERR_TAIL_LINES))
+
+
+@lru_cache(maxsize=32)
+def _load_json_cached(path: str, mtime_ns: int):
+    with open(path, 'rb') as f:
+        return json_loads(f.read())
+
+
+def _load_json(path) -> Dict:
+    """Parse a JSON file once per (path, mtime). The result is shared: do not mutate it."""
+    path = os.fspath(path)
+    return _load_json_cached(path, os.stat(path).st_mtime_ns)
+
+
+def _kokoro_version() -> Optional[str]:
+    """Installed Kokoro package version, or None if it isn't installed here."""
+    try:
+        return importlib.metadata.version('kokoro')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def _link_or_copy(src, dst):
+    """Hardlink src to dst (no bytes copied), copying across devices or where links aren't allowed."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _prune_cache_dir(cache_root: Path, max_entries: int):
+    """Drop the least recently used entries beyond max_entries."""
+    with os.scandir(cache_root) as it:
+        entries = [e for e in it if e.is_dir(follow_symlinks=False) and not e.name.startswith('.')]
+    if len(entries) <= max_entries:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:len(entries) - max_entries]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _remove_trees(paths: List[str]):
+    """Delete directory trees in parallel (each rmtree is independent IO-bound work)."""
+    with ThreadPoolExecutor(max_workers=min(4, len(paths))) as executor:
+        list(executor.map(partial(shutil.rmtree, ignore_errors=True), paths))
+
+
+def _close_handlers(logger: logging.Logger):
+    """Detach and close every handler on a logger."""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+@cache
+def _ffprobe_binary() -> str:
+    """Resolve ffprobe on PATH once per process."""
+    return shutil.which('ffprobe') or 'ffprobe'
+
+
+@lru_cache(maxsize=8)
+def _get_config_validator(schema_path: str, schema_mtime_ns: int):
+    """Return the compiled validator for a schema file.
+
+    The fastjsonschema codegen output is written to .cache/config/ and
+    imported from there, so later processes skip compiling the schema.
+    Memoized per (path, mtime) within a process.
+    """
+    schema_bytes = Path(schema_path).read_bytes()
+    digest = hashlib.sha256(fastjsonschema.VERSION.encode() + b"\0" + schema_bytes).hexdigest()[:16]
+    module_path = CONFIG_CACHE_DIR / f"validator_{digest}.py"
+
+    try:
+        if not module_path.exists():
+            code = fastjsonschema.compile_to_code(json.loads(schema_bytes))
+            CONFIG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = module_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(code, encoding='utf-8')
+            os.replace(tmp_path, module_path)
+
+        code = module_path.read_text(encoding='utf-8')
+        func_name = re.search(r'^def (validate\w*)\(', code, re.MULTILINE).group(1)
+
+        spec = importlib.util.spec_from_file_location(f"_config_validator_{digest}", module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return getattr(module, func_name)
+
+    except (OSError, AttributeError, SyntaxError):
+        # Cache is best-effort; compile in memory instead
+        return fastjsonschema.compile(json.loads(schema_bytes))
+
+
+def _format_schema_error(error: "fastjsonschema.JsonSchemaValueException", config: Dict) -> str:
+    """Map a schema violation to the error wording load_config has always used."""
+    path = error.path[1:]  # Drop the leading 'data'
+
+    if error.rule == 'required':
+        missing = next(f for f in error.rule_definition if f not in error.value)
+        if not path:
+            return f"Missing required field: {missing}"
+        if path[0] == 'script_segments' and len(path) == 2:
+            return f"Segment {error.value.get('segment_id', path[1])} missing '{missing}'"
+
+    if error.rule == 'enum':
+        if len(path) == 1 and path[0] in _ENUM_FIELD_LABELS:
+            allowed = ', '.join(sorted(error.rule_definition))
+            return f"Invalid {_ENUM_FIELD_LABELS[path[0]]}: {error.value}. Must be one of: {allowed}"
+        if path[0] == 'script_segments' and path[-1] == 'type':
+            segment_id = config['script_segments'][int(path[1])]['segment_id']
+            return f"Segment {segment_id} clip {path[3]}: type must be 'video' or 'image'"
+
+    if error.rule == 'minItems' and path == ['script_segments']:
+        return "script_segments cannot be empty"
+
+    return error.message
 
 
 class VideoGenerator:
@@ -21,61 +272,24 @@ class VideoGenerator:
         """Initialize video generator with configuration."""
         self.config_path = config_path
         self.config = self.load_config(config_path)
-        self.project_dir = None
+
+        # Platform-derived render settings, fixed for the life of the config
+        target_platform = self.config['target_platform']
+        self.resolution = PLATFORM_RESOLUTIONS.get(target_platform, "1080x1920")
+        self.subtitle_style = "tiktok" if target_platform in TIKTOK_STYLE_PLATFORMS else "youtube_shorts"
+
+        self.project_dir: Optional[Path] = None
         self.logger = None
         self.clean_previous = clean_previous
+        self._broll_pool: Optional[ProcessPoolExecutor] = None
+        self._broll_encode_workers = 1
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
+        self._log_lock = threading.Lock()
 
     def load_config(self, config_path: str) -> Dict:
         """Load and validate JSON configuration."""
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-
-            # Validate required fields
-            required_fields = ['video_name', 'target_platform', 'target_duration_seconds',
-                             'background_music_genre', 'voice_name', 'script_segments']
-
-            for field in required_fields:
-                if field not in config:
-                    raise ValueError(f"Missing required field: {field}")
-
-            # Validate platform
-            valid_platforms = ['youtube_shorts', 'tiktok', 'instagram_reels', 'youtube_long']
-            if config['target_platform'] not in valid_platforms:
-                raise ValueError(f"Invalid platform: {config['target_platform']}. Must be one of: {', '.join(valid_platforms)}")
-
-            # Validate voice (American English voices from Kokoro-82M)
-            valid_voices = [
-                # Female voices
-                'af_heart', 'af_alloy', 'af_aoede', 'af_bella', 'af_jessica',
-                'af_kore', 'af_nicole', 'af_nova', 'af_river', 'af_sarah', 'af_sky',
-                # Male voices
-                'am_adam', 'am_echo', 'am_eric', 'am_fenrir', 'am_liam',
-                'am_michael', 'am_onyx', 'am_puck', 'am_santa'
-            ]
-            if config['voice_name'] not in valid_voices:
-                raise ValueError(f"Invalid voice: {config['voice_name']}. Must be one of: {', '.join(valid_voices)}")
-
-            # Validate music genre
-            valid_genres = ['lofi', 'trap', 'hiphop', 'edm', 'ambient']
-            if config['background_music_genre'] not in valid_genres:
-                raise ValueError(f"Invalid genre: {config['background_music_genre']}. Must be one of: {', '.join(valid_genres)}")
-
-            # Validate script segments
-            if not config['script_segments']:
-                raise ValueError("script_segments cannot be empty")
-
-            for idx, segment in enumerate(config['script_segments']):
-                if 'segment_id' not in segment:
-                    raise ValueError(f"Segment {idx} missing 'segment_id'")
-                if 'audio_text' not in segment:
-                    raise ValueError(f"Segment {segment.get('segment_id', idx)} missing 'audio_text'")
-                if 'broll_clips' not in segment:
-                    raise ValueError(f"Segment {segment.get('segment_id', idx)} missing 'broll_clips'")
-
-                for clip_idx, clip in enumerate(segment.get('broll_clips', [])):
-                    if 'type' in clip and clip['type'] not in ['video', 'image']:
-                        raise ValueError(f"Segment {segment['segment_id']} clip {clip_idx}: type must be 'video' or 'image'")
+            config = self._load_cached_config(config_path)
 
             print(f"Configuration loaded: {config['video_name']}")
             print(f"  Platform: {config['target_platform']}")
@@ -87,6 +301,33 @@ class VideoGenerator:
             print(f"Error loading configuration: {e}", file=sys.stderr)
             sys.exit(1)
 
+    def _load_cached_config(self, config_path: str) -> Dict:
+        """Parse config, skipping validation if this exact content was validated before."""
+        raw = Path(config_path).read_bytes()
+        digest = hashlib.sha256(CONFIG_SCHEMA_BYTES + b"\0" + raw).hexdigest()
+        marker = CONFIG_CACHE_DIR / f"config_{digest}.valid"
+
+        config = json_loads(raw)
+        if marker.exists():
+            return config
+
+        self._validate_config(config)
+
+        try:
+            CONFIG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+        except OSError:
+            pass  # Cache is best-effort
+        return config
+
+    def _validate_config(self, config: Dict):
+        """Validate config against the JSON schema. Raises ValueError."""
+        try:
+            validate = _get_config_validator(str(CONFIG_SCHEMA_PATH), CONFIG_SCHEMA_PATH.stat().st_mtime_ns)
+            validate(config)
+        except fastjsonschema.JsonSchemaValueException as e:
+            raise ValueError(_format_schema_error(e, config)) from None
+
     def clean_previous_runs(self, video_name: str):
         """Remove incomplete previous runs for this video."""
         try:
@@ -94,22 +335,72 @@ class VideoGenerator:
             if not base_dir.exists():
                 return
 
-            pattern = f"{video_name}_*"
-            matching_dirs = sorted(base_dir.glob(pattern), reverse=True)
+            # One scandir pass; DirEntry caches the type, so no stat per match.
+            # Run names end in a %Y%m%d_%H%M%S timestamp, so sorting by name is
+            # newest-first without an mtime stat per entry.
+            prefix = f"{video_name}_"
+            with os.scandir(base_dir) as entries:
+                dirs = [e for e in entries if e.is_dir(follow_symlinks=False)]
+            run_dirs = sorted(
+                (e for e in dirs if e.name.startswith(prefix)),
+                key=lambda e: e.name,
+                reverse=True
+            )
+
+            # Trash left behind by a run that exited before finishing its deletes
+            trash_dirs = [e.path for e in dirs if e.name.startswith(TRASH_PREFIX)]
+
+            for entry in run_dirs:
+                if os.path.isfile(os.path.join(entry.path, "final_output.mp4")):
+                    print(f"Keeping completed run: {entry.name}")
+                    continue
+
+                print(f"Removing incomplete run: {entry.name}")
+                # One rename now; the tree itself is deleted in the background
+                trash = os.path.join(base_dir, f"{TRASH_PREFIX}{uuid.uuid4().hex}")
+                try:
+                    os.rename(entry.path, trash)
+                except OSError:
+                    trash = entry.path
+                trash_dirs.append(trash)
 
-            for project_dir in matching_dirs:
-                final_video = project_dir / "final_output.mp4"
-                if not final_video.exists():
-                    print(f"Removing incomplete run: {project_dir.name}")
-                    import shutil
-                    shutil.rmtree(project_dir)
-                else:
-                    print(f"Keeping completed run: {project_dir.name}")
+            if trash_dirs:
+                threading.Thread(target=_remove_trees, args=(trash_dirs,), daemon=True).start()
 
         except Exception as e:
             print(f"Warning: Could not clean previous runs: {e}")
 
-    def create_project_structure(self) -> str:
+    # Cached paths derived from project_dir (cleared when a new project starts)
+    _PROJECT_PATHS = ('audio_dir', 'broll_dir', 'log_file', 'final_video')
+
+    @cached_property
+    def audio_dir(self) -> Path:
+        """Project directory for generated audio and timestamps."""
+        return self.project_dir / "audio_segments"
+
+    @cached_property
+    def broll_dir(self) -> Path:
+        """Project directory for processed b-roll clips."""
+        return self.project_dir / "broll"
+
+    @cached_property
+    def log_file(self) -> Path:
+        """Shared generation log for the orchestrator and helpers."""
+        return self.project_dir / "generation.log"
+
+    @cached_property
+    def settings(self) -> Dict:
+        """Pipeline settings from config/settings.json (empty if the file is absent)."""
+        if not SETTINGS_PATH.exists():
+            return {}
+        return _load_json(SETTINGS_PATH)
+
+    @cached_property
+    def final_video(self) -> Path:
+        """Final rendered video path."""
+        return self.project_dir / "final_output.mp4"
+
+    def create_project_structure(self) -> Path:
         """Create project directory structure."""
         try:
             video_name = self.config['video_name'].replace(' ', '_')
@@ -117,193 +408,467 @@ class VideoGenerator:
             if self.clean_previous:
                 self.clean_previous_runs(video_name)
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
             project_name = f"{video_name}_{timestamp}"
 
-            base_dir = Path("generated_videos")
-            base_dir.mkdir(exist_ok=True)
-
-            project_dir = base_dir / project_name
-            project_dir.mkdir(exist_ok=True)
+            project_dir = Path("generated_videos") / project_name
+            project_dir.mkdir(parents=True, exist_ok=True)
 
             # Create subdirectories
-            (project_dir / "audio_segments").mkdir(exist_ok=True)
-            (project_dir / "broll").mkdir(exist_ok=True)
-            (project_dir / "subtitles").mkdir(exist_ok=True)
+            for subdir in PROJECT_SUBDIRS:
+                (project_dir / subdir).mkdir(exist_ok=True)
 
-            # Copy input JSON to project directory
-            import shutil
-            shutil.copy(self.config_path, project_dir / "input.json")
+            # Pin input JSON in the project directory: hardlink (no bytes copied),
+            # falling back to a copy across devices or where links aren't allowed
+            _link_or_copy(self.config_path, project_dir / "input.json")
 
             print(f"\nProject directory created: {project_dir}")
-            return str(project_dir)
+            return project_dir
 
         except Exception as e:
             print(f"Error creating project structure: {e}", file=sys.stderr)
             sys.exit(1)
 
-    def setup_logging(self, project_dir: str):
+    def setup_logging(self):
         """Setup logging to file and console."""
-        log_file = Path(project_dir) / "generation.log"
+        # Release handlers from an earlier run, then swap fresh ones onto the one
+        # pipeline logger so repeated runs in one process (batch jobs, tests)
+        # neither duplicate lines nor leak loggers or log file handles
+        self._stop_log_listener()
 
         self.logger = logging.getLogger(__name__)
+        _close_handlers(self.logger)
         self.logger.setLevel(logging.INFO)
+        # Handlers are attached here; don't repeat every line through the
+        # root logger when an embedding script has configured logging too
+        self.logger.propagate = False
 
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
 
-        file_handler = logging.FileHandler(log_file)
+        file_handler = logging.FileHandler(self.log_file)
         file_handler.setLevel(logging.INFO)
         file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
+
+        # Pipeline threads only enqueue records; one listener thread does the
+        # console/file writes, so slow IO never stalls a b-roll or helper thread
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler, respect_handler_level=True
+        )
+        self._log_listener.start()
 
         self.logger.info("="*70)
         self.logger.info(f"Video Generation Started: {self.config['video_name']}")
         self.logger.info("="*70)
 
-    def run_helper_script(self, script_name: str, args: str) -> bool:
+    def _stop_log_listener(self):
+        """Detach the queue handler, flush queued log records and close the console/file handlers."""
+        if self._log_listener is None:
+            return
+        # Nothing drains the queue once the listener stops: later records must not land in it
+        _close_handlers(self.logger)
+        self._log_listener.stop()
+        for handler in self._log_listener.handlers:
+            handler.close()
+        self._log_listener = None
+
+    def _banner(self, title: str, step: Optional[int] = None):
+        """Print a step banner as a single write."""
+        heading = f"STEP {step}: {title}" if step is not None else title
+        sys.stdout.write(f"\n{BANNER_RULE}\n{heading}\n{BANNER_RULE}\n")
+        sys.stdout.flush()
+
+    def run_helper_script(self, script_name: str, args: List[str]) -> bool:
         """Execute helper script in venv with error handling."""
         try:
             python_exe = sys.executable
 
-            script_path = Path("scripts") / script_name
+            script_path = SCRIPTS_DIR / script_name
             if not script_path.exists():
                 self.logger.error(f"Helper script not found: {script_path}")
                 return False
 
-            cmd = f'"{python_exe}" "{script_path}" {args}'
+            # argv list: no intermediate shell, no quoting of paths with spaces.
+            # -u: a piped child would otherwise block-buffer its stdout, and
+            # progress lines would only arrive when the helper exits.
+            cmd = [python_exe, '-u', str(script_path), *args]
 
             self.logger.info(f"Running: {script_name}")
-            self.logger.debug(f"Command: {cmd}")
+            self.logger.debug(f"Command: {subprocess.list2cmdline(cmd)}")
 
-            result = subprocess.run(
+            with subprocess.Popen(
                 cmd,
-                shell=True,
-                check=True,
-                capture_output=True,
-                text=True
-            )
-
-            if result.stdout:
-                for line in result.stdout.strip().split('\n'):
-                    self.logger.info(f"  {line}")
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1
+            ) as proc:
+                # Drain stderr on a side thread so neither pipe can fill up and stall
+                # the helper; only the tail is kept for the failure report
+                stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+                stderr_reader = threading.Thread(target=stderr_tail.extend, args=(proc.stderr,), daemon=True)
+                stderr_reader.start()
+
+                # Forward stdout as it arrives instead of buffering the whole run
+                for line in proc.stdout:
+                    self.logger.info(f"  {line.rstrip()}")
+
+                returncode = proc.wait()
+                stderr_reader.join()
+
+            if returncode != 0:
+                # Keep the error report contiguous when helpers run concurrently
+                with self._log_lock:
+                    self.logger.error(f"Error running {script_name}:")
+                    for line in stderr_tail:
+                        self.logger.error(f"  {line.rstrip()}")
+                return False
 
             self.logger.info(f"Completed: {script_name}")
             return True
 
-        except subprocess.CalledProcessError as e:
-            self.logger.error(f"Error running {script_name}:")
-            if e.stderr:
-                for line in e.stderr.strip().split('\n'):
-                    self.logger.error(f"  {line}")
-            return False
         except Exception as e:
             self.logger.error(f"Unexpected error running {script_name}: {e}")
             return False
 
-    def generate_video(self) -> bool:
-        """Main video generation pipeline (V2: single audio + fast cuts + ASS subtitles)."""
+    def _start_helper_pool(self, module_name: str, max_workers: int) -> ProcessPoolExecutor:
+        """Start worker processes that import a helper once and serve many calls."""
+        # forkserver forks workers from a clean server process (safe with the
+        # threads we run); fall back to the platform default (spawn on Windows)
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_helper_worker,
+            initargs=(module_name,)
+        )
+
+    def run_helper_in_pool(self, pool: ProcessPoolExecutor, script_name: str, args: List[str]) -> bool:
+        """Call a helper's main() in a resident worker instead of a fresh interpreter."""
         try:
-            # Step 1: Create project structure
-            print("\n" + "="*70)
-            print("STEP 1: Creating Project Structure")
-            print("="*70)
+            self.logger.info(f"Running: {script_name}")
+            returncode, stdout, stderr_tail = pool.submit(_run_helper_main, args).result()
 
-            self.project_dir = self.create_project_structure()
-            self.setup_logging(self.project_dir)
+            for line in stdout.splitlines():
+                self.logger.info(f"  {line}")
 
-            audio_dir = Path(self.project_dir) / "audio_segments"
-            broll_dir = Path(self.project_dir) / "broll"
-            log_file = Path(self.project_dir) / "generation.log"
+            if returncode != 0:
+                # Same report as run_helper_script, kept contiguous across threads
+                with self._log_lock:
+                    self.logger.error(f"Error running {script_name}:")
+                    for line in stderr_tail:
+                        self.logger.error(f"  {line.rstrip()}")
+                return False
 
-            # Step 2: Generate SINGLE audio file + transcribe + timestamps
-            print("\n" + "="*70)
-            print("STEP 2: Generating Full Audio (Single TTS + Transcription)")
-            print("="*70)
+            self.logger.info(f"Completed: {script_name}")
+            return True
 
-            success = self.run_helper_script(
-                'audio_generator.py',
-                f'--json "{self.config_path}" --output-dir "{audio_dir}" '
-                f'--voice {self.config["voice_name"]} --full-audio --log-file "{log_file}"'
-            )
+        except Exception as e:
+            self.logger.error(f"Unexpected error running {script_name}: {e}")
+            return False
 
-            if not success:
-                self.logger.error("Audio generation failed")
+    def _generate_full_audio(self, audio_dir: Path, log_file: Path) -> bool:
+        """Produce full_audio.wav and audio_timestamps.json, reusing a cached narration if possible."""
+        tts_settings = self.settings.get('kokoro_settings', {})
+        backend = tts_settings.get('backend', TTS_BACKEND)
+        whisper_model = tts_settings.get('whisper_model', TTS_WHISPER_MODEL)
+        # None leaves the choice to audio_generator (by device)
+        whisper_compute_type = tts_settings.get('whisper_compute_type')
+
+        # TTS + transcription depend on the voice, the script text and what renders them
+        key_source = json.dumps(
+            [self.config['voice_name'],
+             [[seg['segment_id'], seg['audio_text']] for seg in self.config['script_segments']],
+             backend, whisper_model, whisper_compute_type, _kokoro_version()]
+        )
+        cache_dir = TTS_CACHE_DIR / hashlib.blake2b(key_source.encode('utf-8'), digest_size=16).hexdigest()
+
+        try:
+            for name in TTS_CACHE_FILES:
+                _link_or_copy(cache_dir / name, audio_dir / name)
+            os.utime(cache_dir)  # Mark as recently used for pruning
+            self.logger.info(f"Reused cached narration: {cache_dir.name}")
+            return True
+        except OSError:
+            # Cache miss (or a damaged entry): drop anything partially linked
+            for name in TTS_CACHE_FILES:
+                (audio_dir / name).unlink(missing_ok=True)
+
+        tts_args = ['--json', self.config_path, '--output-dir', str(audio_dir),
+                    '--voice', self.config['voice_name'], '--full-audio',
+                    '--backend', backend, '--whisper-model', whisper_model, '--log-file', str(log_file)]
+        if whisper_compute_type:
+            tts_args += ['--whisper-compute-type', whisper_compute_type]
+
+        success = self.run_helper_script('audio_generator.py', tts_args)
+        if not success:
+            return False
+
+        # Best-effort: publish the new entry in one rename
+        staging = cache_dir.with_name(f".{cache_dir.name}_{uuid.uuid4().hex}")
+        try:
+            staging.mkdir(parents=True)
+            for name in TTS_CACHE_FILES:
+                _link_or_copy(audio_dir / name, staging / name)
+            os.replace(staging, cache_dir)
+            _prune_cache_dir(TTS_CACHE_DIR, TTS_CACHE_MAX_ENTRIES)
+        except OSError as e:
+            self.logger.debug(f"Could not cache narration: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+
+        return True
+
+    def _prefetch_broll_for_segment(self, segment: Dict, broll_dir: Path, log_file: Path) -> bool:
+        """Warm the b-roll search cache for a single segment (no downloads)."""
+        return self.run_helper_in_pool(
+            self._broll_pool, 'broll_fetcher.py',
+            ['--json', self.config_path, '--segment-id', str(segment['segment_id']),
+             '--output-dir', str(broll_dir), '--prefetch', '--log-file', str(log_file)]
+        )
+
+    def _fetch_broll_for_segment(self, seg_timing: Dict, broll_dir: Path, resolution: str,
+                                 cut_freq: float, speed_range: List[float], log_file: Path) -> Tuple[int, bool]:
+        """Fetch b-roll for a single segment. Returns (segment_id, success)."""
+        segment_id = seg_timing['segment_id']
+        segment_duration = seg_timing['duration']
+
+        if segment_duration <= 0:
+            # Wordless segment (empty word range): no narration to cover
+            self.logger.info(f"Segment {segment_id} has no audio, skipping b-roll")
+            return segment_id, True
+
+        cache_dir = self._broll_cache_entry(segment_id, segment_duration, resolution, cut_freq, speed_range)
+        if cache_dir is not None and self._restore_cached_broll(cache_dir, segment_id, broll_dir):
+            self.logger.info(f"Reused cached b-roll for segment {segment_id} ({segment_duration:.2f}s)")
+            return segment_id, True
+
+        self.logger.info(f"Fetching b-roll for segment {segment_id} ({segment_duration:.2f}s)")
+
+        success = self.run_helper_in_pool(
+            self._broll_pool, 'broll_fetcher.py',
+            ['--json', self.config_path, '--segment-id', str(segment_id),
+             '--output-dir', str(broll_dir), '--resolution', resolution,
+             '--segment-duration', str(segment_duration),
+             '--cut-frequency', str(cut_freq),
+             '--speed-min', str(speed_range[0]), '--speed-max', str(speed_range[1]),
+             '--encode-workers', str(self._broll_encode_workers),
+             '--log-file', str(log_file)]
+        )
+
+        if success and cache_dir is not None:
+            # Same clip count broll_fetcher aims for; partial results aren't cached
+            expected_clips = max(1, math.ceil(segment_duration / cut_freq))
+            self._store_broll_in_cache(cache_dir, segment_id, broll_dir, expected_clips)
+
+        return segment_id, success
+
+    def _broll_cache_entry(self, segment_id: int, segment_duration: float, resolution: str,
+                           cut_freq: float, speed_range: List[float]) -> Optional[Path]:
+        """Cache directory for a segment's processed clips, or None if it can't be keyed."""
+        segment = next((s for s in self.config['script_segments'] if s['segment_id'] == segment_id), None)
+        if segment is None:
+            return None
+        # Clip count and lengths follow from the duration, so it is keyed exactly; the
+        # fetcher's mtime stands in for its processing (encoder, filters, crop) settings
+        try:
+            fetcher_version = (SCRIPTS_DIR / 'broll_fetcher.py').stat().st_mtime_ns
+        except OSError:
+            return None
+        key_source = json.dumps(
+            [segment.get('broll_clips', []), segment_duration, resolution, cut_freq, list(speed_range),
+             fetcher_version],
+            sort_keys=True
+        )
+        key = hashlib.blake2b(key_source.encode('utf-8'), digest_size=16).hexdigest()
+        return BROLL_CACHE_DIR / key
+
+    def _restore_cached_broll(self, cache_dir: Path, segment_id: int, broll_dir: Path) -> bool:
+        """Link a cached segment's clips into broll_dir. Returns False on a cache miss."""
+        try:
+            clip_names = sorted(os.listdir(cache_dir))
+            if not clip_names:
                 return False
+            # Clips keep their encode time; the directory mtime only tracks use
+            age = time.time() - (cache_dir / clip_names[0]).stat().st_mtime
+            if age > BROLL_CACHE_TTL_HOURS * 3600:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                return False
+            for name in clip_names:
+                _link_or_copy(cache_dir / name, broll_dir / f"segment_{segment_id:03d}_{name}")
+            os.utime(cache_dir)  # Mark as recently used for pruning
+            return True
+        except OSError:
+            return False
+
+    def _store_broll_in_cache(self, cache_dir: Path, segment_id: int, broll_dir: Path, expected_clips: int):
+        """Hardlink a segment's finished clips into the b-roll cache (best-effort)."""
+        prefix = f"segment_{segment_id:03d}_"
+        staging = cache_dir.with_name(f".{cache_dir.name}_{uuid.uuid4().hex}")
+        try:
+            with os.scandir(broll_dir) as entries:
+                clips = [e for e in entries
+                         if e.name.startswith(prefix) and e.name.endswith('.mp4') and '_temp' not in e.name]
+            if len(clips) < expected_clips:
+                return
 
-            # Load timestamps for subsequent steps
+            staging.mkdir(parents=True)
+            for entry in clips:
+                _link_or_copy(entry.path, staging / entry.name[len(prefix):])
+            # Publish the entry in one rename so readers never see it half-filled
+            os.replace(staging, cache_dir)
+            _prune_cache_dir(BROLL_CACHE_DIR, BROLL_CACHE_MAX_ENTRIES)
+        except OSError as e:
+            self.logger.debug(f"Could not cache b-roll for segment {segment_id}: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _follow_segment_timings(self, timings_path: Path, producer: Future) -> Iterator[Dict]:
+        """Yield segment timings from the audio helper's ndjson stream until the helper exits."""
+        timings_file = None
+        pending = ''
+        try:
+            while True:
+                # Check before reading so the last read happens after the helper exited
+                finished = producer.done()
+
+                if timings_file is None and timings_path.exists():
+                    timings_file = open(timings_path, 'r', encoding='utf-8')
+
+                if timings_file is not None:
+                    pending += timings_file.read()
+                    *lines, pending = pending.split('\n')
+                    for line in lines:
+                        if line:
+                            yield json_loads(line)
+
+                if finished:
+                    return
+                wait([producer], timeout=TIMINGS_POLL_SECONDS)
+        finally:
+            if timings_file is not None:
+                timings_file.close()
+
+    def generate_video(self) -> bool:
+        """Main video generation pipeline (V2: single audio + fast cuts + ASS subtitles)."""
+        try:
+            # Step 1: Create project structure
+            self._banner("Creating Project Structure", step=1)
+
+            self.project_dir = self.create_project_structure()
+            for name in self._PROJECT_PATHS:
+                self.__dict__.pop(name, None)
+            self.setup_logging()
+
+            # Every path the steps below need, built once
+            audio_dir = self.audio_dir
+            broll_dir = self.broll_dir
+            log_file = self.log_file
+            timings_path = audio_dir / "audio_timestamps.ndjson"
             timestamps_path = audio_dir / "audio_timestamps.json"
-            if not timestamps_path.exists():
-                self.logger.error("audio_timestamps.json not found after audio generation")
-                return False
+            final_video = self.final_video
+            final_video_with_subs = self.project_dir / "final_output_with_subtitles.mp4"
+
+            # Step 2: Generate SINGLE audio file + transcribe + timestamps
+            self._banner("Generating Full Audio (Single TTS + Transcription)", step=2)
 
-            with open(timestamps_path, 'r', encoding='utf-8') as f:
-                timestamps = json.load(f)
-
-            self.logger.info(f"Audio timestamps loaded: {len(timestamps['words'])} words, "
-                           f"{len(timestamps['segments'])} segments, "
-                           f"{timestamps['total_duration']:.2f}s total")
-
-            # Step 3: Fetch b-roll for each segment (with fast cuts)
-            print("\n" + "="*70)
-            print("STEP 3: Fetching B-Roll Footage (Fast Cuts)")
-            print("="*70)
-
-            target_platform = self.config['target_platform']
-            platform_resolutions = {
-                "youtube_shorts": "1080x1920",
-                "tiktok": "1080x1920",
-                "instagram_reels": "1080x1920",
-                "youtube_long": "1920x1080"
-            }
-            resolution = platform_resolutions.get(target_platform, "1080x1920")
-
-            # Load broll settings from settings.json
-            broll_settings = {}
-            settings_path = Path("config/settings.json")
-            if settings_path.exists():
-                with open(settings_path, 'r') as f:
-                    all_settings = json.load(f)
-                broll_settings = all_settings.get('broll', {})
+            resolution = self.resolution
+            broll_settings = self.settings.get('broll', {})
 
             cut_freq = broll_settings.get('cut_frequency_seconds', 2.5)
             speed_range = broll_settings.get('speed_range', [1.2, 2.0])
 
-            for seg_timing in timestamps['segments']:
-                segment_id = seg_timing['segment_id']
-                segment_duration = seg_timing['duration']
-
-                self.logger.info(f"Fetching b-roll for segment {segment_id} ({segment_duration:.2f}s)")
-
-                success = self.run_helper_script(
-                    'broll_fetcher.py',
-                    f'--json "{self.config_path}" --segment-id {segment_id} '
-                    f'--output-dir "{broll_dir}" --resolution {resolution} '
-                    f'--segment-duration {segment_duration} '
-                    f'--cut-frequency {cut_freq} '
-                    f'--speed-min {speed_range[0]} --speed-max {speed_range[1]} '
-                    f'--log-file "{log_file}"'
-                )
+            segments = self.config['script_segments']
+            workers = max(1, min(8, len(segments)))
+
+            # broll_fetcher runs twice per segment; keep its interpreters resident
+            # for the whole run. The GPU helpers stay one-shot subprocesses so their
+            # VRAM is released as soon as they exit.
+            self._broll_pool = self._start_helper_pool('broll_fetcher', workers)
+            # Each resident fetcher would default to a full machine's worth of encodes:
+            # split the cores between them instead, counting each encode's threads
+            self._broll_encode_workers = max(1, (os.cpu_count() or 1) // (workers * BROLL_ENCODE_THREADS))
+
+            # One extra thread drives the audio helper; the rest serve b-roll work
+            with ThreadPoolExecutor(max_workers=workers + 1) as executor:
+                # Submitted first so the critical-path TTS never queues behind prefetches
+                audio_job = executor.submit(self._generate_full_audio, audio_dir, log_file)
+
+                # B-roll clip counts depend on the transcribed segment durations, but the
+                # API searches do not: warm the search cache while TTS runs on the GPU
+                prefetches = [
+                    executor.submit(self._prefetch_broll_for_segment, segment, broll_dir, log_file)
+                    for segment in segments
+                ]
+
+                # Segment timings stream out during transcription; start each
+                # segment's b-roll fetch as soon as its duration is known
+                fetches = {}
+                for seg_timing in self._follow_segment_timings(timings_path, audio_job):
+                    fetches[seg_timing['segment_id']] = executor.submit(
+                        self._fetch_broll_for_segment,
+                        seg_timing, broll_dir, resolution, cut_freq, speed_range, log_file
+                    )
+
+                success = audio_job.result()
+
+                prefetched = sum(1 for future in prefetches if future.result())
+                self.logger.info(f"B-roll searches prefetched for {prefetched}/{len(segments)} segments")
 
                 if not success:
-                    self.logger.warning(f"B-roll fetch failed for segment {segment_id}")
+                    for future in fetches.values():
+                        future.cancel()
+                    self.logger.error("Audio generation failed")
+                    return False
+
+                # Load timestamps for subsequent steps
+                if not timestamps_path.exists():
+                    self.logger.error("audio_timestamps.json not found after audio generation")
+                    return False
+
+                timestamps = _load_json(timestamps_path)
+
+                self.logger.info(f"Audio timestamps loaded: {len(timestamps['words'])} words, "
+                               f"{len(timestamps['segments'])} segments, "
+                               f"{timestamps['total_duration']:.2f}s total")
+
+                # Step 3: Fetch b-roll for each segment (with fast cuts)
+                self._banner("Fetching B-Roll Footage (Fast Cuts)", step=3)
+
+                # Anything the timing stream did not cover is fetched now
+                segments = timestamps['segments']
+                for seg_timing in segments:
+                    if seg_timing['segment_id'] not in fetches:
+                        fetches[seg_timing['segment_id']] = executor.submit(
+                            self._fetch_broll_for_segment,
+                            seg_timing, broll_dir, resolution, cut_freq, speed_range, log_file
+                        )
+
+                # Report each segment as soon as it finishes, not in submission order
+                fetched = 0
+                for future in as_completed(fetches.values()):
+                    segment_id, success = future.result()
+                    with self._log_lock:
+                        if success:
+                            fetched += 1
+                        else:
+                            self.logger.warning(f"B-roll fetch failed for segment {segment_id}")
+
+            self.logger.info(f"B-roll fetched for {fetched}/{len(segments)} segments")
 
             # Step 4: Assemble video (single audio + all b-roll + music)
-            print("\n" + "="*70)
-            print("STEP 4: Assembling Video (Audio + B-Roll + Music)")
-            print("="*70)
+            self._banner("Assembling Video (Audio + B-Roll + Music)", step=4)
 
             music_genre = self.config['background_music_genre']
 
             success = self.run_helper_script(
                 'video_assembler.py',
-                f'--json "{self.config_path}" --project-dir "{self.project_dir}" '
-                f'--music-genre {music_genre} '
-                f'--timestamps-json "{timestamps_path}" '
-                f'--log-file "{log_file}"'
+                ['--json', self.config_path, '--project-dir', str(self.project_dir),
+                 '--music-genre', music_genre,
+                 '--timestamps-json', str(timestamps_path),
+                 '--log-file', str(log_file)]
             )
 
             if not success:
@@ -311,36 +876,24 @@ class VideoGenerator:
                 return False
 
             # Step 5: Add ASS subtitles using pre-computed word timestamps
-            print("\n" + "="*70)
-            print("STEP 5: Adding Word-by-Word Animated Subtitles")
-            print("="*70)
-
-            style = "tiktok" if target_platform in ["tiktok", "instagram_reels"] else "youtube_shorts"
-
-            final_video_no_subs = Path(self.project_dir) / "final_output.mp4"
-            final_video_with_subs = Path(self.project_dir) / "final_output_with_subtitles.mp4"
+            self._banner("Adding Word-by-Word Animated Subtitles", step=5)
 
             success = self.run_helper_script(
                 'subtitle_generator.py',
-                f'--video "{final_video_no_subs}" --output "{final_video_with_subs}" '
-                f'--timestamps-json "{timestamps_path}" '
-                f'--style {style} --log-file "{log_file}"'
+                ['--video', str(final_video), '--output', str(final_video_with_subs),
+                 '--timestamps-json', str(timestamps_path),
+                 '--style', self.subtitle_style, '--log-file', str(log_file)]
             )
 
             if success:
-                # Replace original with subtitled version
-                import shutil
-                shutil.move(str(final_video_with_subs), str(final_video_no_subs))
+                # Replace original with subtitled version (same directory: atomic rename)
+                os.replace(final_video_with_subs, final_video)
                 self.logger.info("Subtitles added to final video")
             else:
                 self.logger.warning("Subtitle generation failed, keeping video without subtitles")
 
             # Step 6: Validate final video
-            print("\n" + "="*70)
-            print("STEP 6: Validation")
-            print("="*70)
-
-            final_video = Path(self.project_dir) / "final_output.mp4"
+            self._banner("Validation", step=6)
 
             if not final_video.exists():
                 self.logger.error("Final video file not found")
@@ -362,9 +915,7 @@ class VideoGenerator:
                 print("\nDuration validation passed")
 
             # Success!
-            print("\n" + "="*70)
-            print("VIDEO GENERATION COMPLETE!")
-            print("="*70)
+            self._banner("VIDEO GENERATION COMPLETE!")
             print(f"\nFinal video: {final_video}")
             print(f"Project folder: {self.project_dir}")
             print(f"Duration: {actual_duration:.2f}s")
@@ -383,14 +934,36 @@ class VideoGenerator:
                 print(f"Error: {e}", file=sys.stderr)
             return False
 
+        finally:
+            if self._broll_pool is not None:
+                self._broll_pool.shutdown()
+                self._broll_pool = None
+            self._stop_log_listener()
+
     def get_video_duration(self, video_path: str) -> float:
-        """Get video duration using ffprobe."""
+        """Get video duration from the MP4 header, falling back to ffprobe."""
+        # Missing or truncated output: nothing for the header parser or ffprobe to read
         try:
-            import ffmpeg
-            probe = ffmpeg.probe(video_path)
-            duration = float(probe['format']['duration'])
-            return duration
-        except:
+            if os.stat(video_path).st_size < MIN_VIDEO_BYTES:
+                return 0.0
+        except OSError:
+            return 0.0
+
+        try:
+            duration = read_mp4_duration(video_path)
+            if duration is not None:
+                return duration
+        except OSError:
+            pass
+
+        try:
+            result = subprocess.run(
+                [_ffprobe_binary(), '-v', 'quiet', '-print_format', 'json', '-show_format', video_path],
+                check=True,
+                capture_output=True
+            )
+            return float(json_loads(result.stdout)['format']['duration'])
+        except Exception:
             return 0.0
 
 
@@ -6,44 +6,320 @@ Supports single full-audio generation with word-level timestamps.
 """
 
 import argparse
+import itertools
 import json
 import logging
+import mmap
 import os
+import re
+import struct
 import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 try:
-    from kokoro import KPipeline
+    from kokoro import KModel, KPipeline
     import numpy as np
+    import torch
     from scipy.io import wavfile
+    from scipy.signal import resample_poly
     import soundfile as sf
 except ImportError as e:
     print(f"Error: Missing required package: {e}")
     print("Install with: pip install kokoro scipy soundfile")
     sys.exit(1)
 
+from fast_json import json_dumps
+
+try:
+    import tensorrt as trt
+except ImportError:
+    trt = None  # Only needed for --backend trt
+
+# Kokoro-82M output sample rate
+SAMPLE_RATE = 24000
+
+# 16-bit PCM is plenty for speech and half the bytes of float WAV
+WAV_SUBTYPE = 'PCM_16'
+
+# Legacy per-segment mode: synthesized segments allowed to wait for the WAV writer
+WRITE_QUEUE_DEPTH = 4
+
+# O_DIRECT writes must be a whole number of blocks from a block-aligned buffer
+DIRECT_IO_ALIGNMENT = 4096
+
+# Short phrase run once through a freshly compiled model so the compile cost
+# isn't paid on the first real segment
+COMPILE_WARMUP_TEXT = "Warming up the voice model."
+
+# Default serialized TensorRT engine, built from Kokoro's ONNX export with
+# `trtexec --onnx=kokoro.onnx --fp16 --saveEngine=kokoro.plan`
+TRT_ENGINE_PATH = "kokoro.plan"
+
+# Longest token sequence (BOS + 510 phonemes + EOS) the TensorRT input buffer holds
+TRT_MAX_TOKENS = 512
+
+# Long text is split at sentence ends and regrouped into units of about this
+# many characters, which are synthesized in parallel; similar-sized units keep
+# the workers evenly loaded
+SENTENCE_UNIT_CHARS = 400
+
+# Whisper's input sample rate (Kokoro's 24kHz resamples to it by an exact 2/3)
+WHISPER_SAMPLE_RATE = 16000
+
+# Chunks decoded per batch by faster-whisper's BatchedInferencePipeline
+WHISPER_BATCH_SIZE = 16
+
+# English-only distilled model: word boundaries of clean TTS audio don't need
+# a larger multilingual checkpoint
+WHISPER_MODEL = "distil-small.en"
+
+
+def _concat_chunks(audio_chunks: List):
+    """Join Kokoro chunks into one preallocated, contiguous float32 buffer.
+
+    Each chunk is released as soon as it is copied, so peak memory stays near
+    one copy of the audio instead of two.
+    """
+    if len(audio_chunks) == 1:
+        audio_array = np.ascontiguousarray(audio_chunks[0], dtype=np.float32)
+    else:
+        audio_array = np.empty(sum(len(chunk) for chunk in audio_chunks), dtype=np.float32)
+        offset = 0
+        for i, chunk in enumerate(audio_chunks):
+            chunk = np.ascontiguousarray(chunk, dtype=np.float32)
+            audio_array[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+            audio_chunks[i] = None
+
+    if audio_array.dtype != np.float32 or not audio_array.flags['C_CONTIGUOUS'] or audio_array.ndim != 1:
+        raise ValueError(f"Expected contiguous 1-D float32 audio, got {audio_array.dtype} "
+                         f"with shape {audio_array.shape}")
+    return audio_array
+
+
+if trt is not None:
+    class _TRTOutputAllocator(trt.IOutputAllocator):
+        """Device buffer for the waveform, whose length TensorRT only knows at run time.
+
+        The buffer is kept between calls and only grows, so steady-state
+        inference does no allocation.
+        """
+
+        def __init__(self, device):
+            super().__init__()
+            self.device = device
+            self.buffer = None
+            self.shape = None
+
+        def reallocate_output(self, tensor_name, memory, size, alignment):
+            if self.buffer is None or self.buffer.numel() < size:
+                self.buffer = torch.empty(size, dtype=torch.uint8, device=self.device)
+            return self.buffer.data_ptr()
+
+        def notify_shape(self, tensor_name, shape):
+            self.shape = tuple(shape)
+
+
+class _TRTKokoroModel:
+    """Drop-in for KModel that runs a serialized TensorRT engine.
+
+    Engine inputs are taken in order as (tokens, style, speed); the single
+    output is the waveform. No durations come back, so word timings fall
+    back to transcription.
+    """
+
+    def __init__(self, engine_path: str, vocab: Dict[str, int]):
+        if trt is None:
+            raise RuntimeError("TensorRT backend requested but tensorrt is not installed. pip install tensorrt")
+
+        self.vocab = vocab
+        self.device = torch.device('cuda')
+
+        runtime = trt.Runtime(trt.Logger(trt.Logger.WARNING))
+        with open(engine_path, 'rb') as f:
+            self.engine = runtime.deserialize_cuda_engine(f.read())
+        if self.engine is None:
+            raise RuntimeError(f"Could not load TensorRT engine: {engine_path}")
+        self.context = self.engine.create_execution_context()
+        self.stream = torch.cuda.Stream()
+
+        names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        inputs = [n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT]
+        outputs = [n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.OUTPUT]
+        self.tokens_name, self.style_name, self.speed_name = inputs
+        self.audio_name = outputs[0]
+
+        # Pinned staging buffer and device buffers are allocated once and reused
+        self.host_tokens = torch.zeros(TRT_MAX_TOKENS, dtype=torch.int64).pin_memory()
+        self.tokens = torch.zeros((1, TRT_MAX_TOKENS), dtype=torch.int64, device=self.device)
+        self.style = torch.zeros((1, 256), dtype=torch.float32, device=self.device)
+        self.speed = torch.ones(1, dtype=torch.float32, device=self.device)
+        self.context.set_tensor_address(self.tokens_name, self.tokens.data_ptr())
+        self.context.set_tensor_address(self.style_name, self.style.data_ptr())
+        self.context.set_tensor_address(self.speed_name, self.speed.data_ptr())
+        self.allocator = _TRTOutputAllocator(self.device)
+        self.context.set_output_allocator(self.audio_name, self.allocator)
+
+    def __call__(self, phonemes: str, ref_s, speed: float = 1, return_output: bool = False):
+        ids = [0, *(i for i in map(self.vocab.get, phonemes) if i is not None), 0]
+        n = len(ids)
+        if n > TRT_MAX_TOKENS:
+            raise ValueError(f"Phoneme sequence too long for TensorRT engine: {n} > {TRT_MAX_TOKENS}")
+
+        with torch.cuda.stream(self.stream):
+            self.host_tokens[:n] = torch.tensor(ids, dtype=torch.int64)
+            self.tokens[0, :n].copy_(self.host_tokens[:n], non_blocking=True)
+            self.style.copy_(ref_s.reshape(1, -1), non_blocking=True)
+            self.speed.fill_(speed)
+        self.context.set_input_shape(self.tokens_name, (1, n))
+
+        if not self.context.execute_async_v3(self.stream.cuda_stream):
+            raise RuntimeError("TensorRT inference failed")
+        self.stream.synchronize()
+
+        samples = 1
+        for dim in self.allocator.shape:
+            samples *= dim
+        audio = self.allocator.buffer[:samples * 4].view(torch.float32).cpu()
+
+        return KModel.Output(audio=audio, pred_dur=None) if return_output else audio
+
+
+def _write_wav_direct(path: str, audio_array):
+    """Write 16-bit mono WAV with O_DIRECT, bypassing the page cache.
+
+    The header and samples are laid out in a page-aligned mmap buffer padded
+    to DIRECT_IO_ALIGNMENT, written in one pwrite and truncated back to the
+    real size. Falls back to sf.write where O_DIRECT is unavailable or the
+    filesystem rejects it.
+    """
+    if not hasattr(os, 'O_DIRECT'):
+        sf.write(path, audio_array, SAMPLE_RATE, subtype=WAV_SUBTYPE)
+        return
+
+    samples = (np.clip(audio_array, -1.0, 1.0) * 32767).astype('<i2')
+    data_size = samples.nbytes
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16,
+                         1, 1, SAMPLE_RATE, SAMPLE_RATE * 2, 2, 16, b'data', data_size)
+    size = len(header) + data_size
+    padded_size = -(-size // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT
+
+    with mmap.mmap(-1, padded_size) as buffer:
+        buffer[:len(header)] = header
+        buffer[len(header):size] = samples.tobytes()
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o644)
+            try:
+                written = os.pwrite(fd, buffer, 0)
+                if written != len(buffer):
+                    # Short O_DIRECT write: rewritten in full by the buffered writer below
+                    raise OSError(f"short write ({written} of {len(buffer)} bytes)")
+                os.ftruncate(fd, size)
+            finally:
+                os.close(fd)
+        except OSError:
+            # e.g. tmpfs, which doesn't support O_DIRECT
+            sf.write(path, audio_array, SAMPLE_RATE, subtype=WAV_SUBTYPE)
+
+
+def _sentence_units(text: str) -> List[str]:
+    """Split text at sentence ends and regroup into units of ~SENTENCE_UNIT_CHARS."""
+    units = []
+    current = ''
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > SENTENCE_UNIT_CHARS:
+            units.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        units.append(current)
+    return units
+
+
+class _GPUFeatureExtractor:
+    """Whisper log-mel features computed with torch on the GPU.
+
+    Wraps faster-whisper's FeatureExtractor and mirrors its math (centered
+    STFT, power spectrum, mel projection, log10 clamp and scale); the Hann
+    window and mel filterbank are uploaded once.
+    """
+
+    def __init__(self, extractor, device: str = 'cuda'):
+        self._extractor = extractor
+        self.device = device
+        self.window = torch.hann_window(extractor.n_fft, device=device)
+        self.mel_filters = torch.from_numpy(extractor.mel_filters).to(device=device, dtype=torch.float32)
+
+    def __getattr__(self, name):
+        return getattr(self._extractor, name)
+
+    def __call__(self, waveform, padding: int = 160, chunk_length: Optional[int] = None):
+        if chunk_length is not None:
+            self._extractor.n_samples = chunk_length * self._extractor.sampling_rate
+            self._extractor.nb_max_frames = self._extractor.n_samples // self._extractor.hop_length
+
+        audio = torch.as_tensor(waveform, dtype=torch.float32).to(self.device, non_blocking=True)
+        if padding:
+            audio = torch.nn.functional.pad(audio, (0, padding))
+
+        stft = torch.stft(audio, self._extractor.n_fft, self._extractor.hop_length,
+                          window=self.window, return_complex=True)
+        magnitudes = stft[..., :-1].abs() ** 2
+        log_spec = torch.clamp(self.mel_filters @ magnitudes, min=1e-10).log10()
+        log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+        return log_spec.cpu().numpy()
+
+
+def _kokoro_vocab(repo_id: str) -> Dict[str, int]:
+    """Phoneme vocabulary from the Kokoro model config (no weights are loaded)."""
+    from huggingface_hub import hf_hub_download
+
+    with open(hf_hub_download(repo_id=repo_id, filename='config.json'), encoding='utf-8') as f:
+        return json.load(f)['vocab']
+
 
 class AudioGenerator:
     # American English voices from Kokoro-82M
-    VALID_VOICES = [
+    VALID_VOICES = frozenset({
         # Female voices (11)
         'af_heart', 'af_alloy', 'af_aoede', 'af_bella', 'af_jessica',
         'af_kore', 'af_nicole', 'af_nova', 'af_river', 'af_sarah', 'af_sky',
         # Male voices (9)
         'am_adam', 'am_echo', 'am_eric', 'am_fenrir', 'am_liam',
         'am_michael', 'am_onyx', 'am_puck', 'am_santa'
-    ]
+    })
 
-    def __init__(self, voice_name: str = "af_bella", use_gpu: bool = True, log_file: Optional[str] = None):
+    # Loaded Kokoro pipelines shared by every AudioGenerator in the process, keyed by
+    # (lang_code, repo_id, backend, compiled, slot); each parallel worker slot gets its own
+    _pipeline_cache: Dict[tuple, KPipeline] = {}
+    _pipeline_cache_lock = threading.Lock()
+
+    def __init__(self, voice_name: str = "af_bella", use_gpu: bool = True, log_file: Optional[str] = None,
+                 compile_model: bool = False, backend: str = "pytorch", trt_engine: str = TRT_ENGINE_PATH,
+                 whisper_model: str = WHISPER_MODEL, whisper_compute_type: Optional[str] = None):
         """Initialize TTS engine with GPU acceleration."""
         self.voice_name = voice_name
         self.use_gpu = use_gpu
+        self.compile_model = compile_model
+        self.backend = backend
+        self.trt_engine = trt_engine
+        self.whisper_model = whisper_model
+        self.whisper_compute_type = whisper_compute_type
         self.setup_logging(log_file)
         self.pipeline = None  # Lazy initialization
+        self.whisper = None  # Lazy initialization, reused across generate_full_audio calls
+        self._thread_state = threading.local()  # Pipeline slot of each parallel worker
 
         if voice_name not in self.VALID_VOICES:
-            raise ValueError(f"Unknown voice: {voice_name}. Available: {self.VALID_VOICES}")
+            raise ValueError(f"Unknown voice: {voice_name}. Available: {sorted(self.VALID_VOICES)}")
 
     def _init_pipeline(self):
         """Lazy initialize Kokoro pipeline (downloads model on first use)."""
@@ -51,14 +327,73 @@ class AudioGenerator:
             return
 
         try:
-            self.logger.info(f"Initializing Kokoro TTS pipeline...")
-            # Initialize pipeline - it will auto-download model to cache
-            self.pipeline = KPipeline(lang_code='a', repo_id='hexgrad/Kokoro-82M')
-            self.logger.info(f"Kokoro pipeline initialized successfully")
+            self.pipeline = self._cached_pipeline()
         except Exception as e:
             self.logger.error(f"Failed to initialize Kokoro pipeline: {e}")
             raise
 
+    def _init_whisper(self) -> bool:
+        """Lazy initialize the faster-whisper model. False if faster-whisper is unavailable."""
+        if self.whisper is not None:
+            return True
+
+        try:
+            from faster_whisper import BatchedInferencePipeline, WhisperModel
+        except ImportError:
+            self.logger.error("faster-whisper not installed. pip install faster-whisper")
+            return False
+
+        device = "cuda" if self.use_gpu else "cpu"
+        compute_type = self.whisper_compute_type or ("int8_float16" if device == "cuda" else "int8")
+        self.logger.info(f"Loading Whisper model {self.whisper_model} ({compute_type})...")
+        model = WhisperModel(self.whisper_model, device=device, compute_type=compute_type,
+                             cpu_threads=max(1, (os.cpu_count() or 2) // 2), num_workers=2)
+        if device == "cuda":
+            model.feature_extractor = _GPUFeatureExtractor(model.feature_extractor, device)
+
+        # Batched pipeline: VAD-split chunks are decoded together instead of
+        # one 30s window at a time, which keeps the GPU busy
+        self.whisper = BatchedInferencePipeline(model=model)
+        return True
+
+    def _cached_pipeline(self, slot: int = 0):
+        """Return the process-wide pipeline for this slot, loading it on first use."""
+        key = ('a', 'hexgrad/Kokoro-82M', self.backend, self.compile_model, slot)
+        with AudioGenerator._pipeline_cache_lock:
+            pipeline = AudioGenerator._pipeline_cache.get(key)
+            if pipeline is None:
+                self.logger.info(f"Initializing Kokoro TTS pipeline (slot {slot})...")
+                # Initialize pipeline - it will auto-download model to cache
+                pipeline = self._new_pipeline()
+                AudioGenerator._pipeline_cache[key] = pipeline
+                self.logger.info(f"Kokoro pipeline initialized successfully")
+        return pipeline
+
+    def _new_pipeline(self):
+        """Build a Kokoro pipeline, compiling and warming up its model if requested."""
+        if self.backend == 'trt':
+            # G2P and voice packs stay in KPipeline; only the model call goes to TensorRT
+            pipeline = KPipeline(lang_code='a', repo_id='hexgrad/Kokoro-82M', model=False)
+            pipeline.model = _TRTKokoroModel(self.trt_engine, _kokoro_vocab('hexgrad/Kokoro-82M'))
+            return pipeline
+
+        pipeline = KPipeline(lang_code='a', repo_id='hexgrad/Kokoro-82M')
+        # Each pipeline launches on its own stream so parallel workers overlap on the
+        # GPU instead of queueing behind each other on the default stream
+        pipeline.cuda_stream = torch.cuda.Stream() if torch.cuda.is_available() else None
+
+        if self.compile_model:
+            self.logger.info("Compiling Kokoro model with torch.compile (one-time cost)...")
+            # reduce-overhead captures CUDA graphs, removing per-kernel launch cost at batch=1;
+            # dynamic=True keeps one graph family across varying phoneme lengths
+            pipeline.model = torch.compile(pipeline.model, mode="reduce-overhead",
+                                           fullgraph=False, dynamic=True)
+            with torch.cuda.stream(pipeline.cuda_stream):
+                for _ in pipeline(COMPILE_WARMUP_TEXT, voice=self.voice_name):
+                    pass
+
+        return pipeline
+
     def setup_logging(self, log_file: Optional[str] = None):
         """Configure logging to console and optional file."""
         self.logger = logging.getLogger(__name__)
@@ -78,41 +413,85 @@ class AudioGenerator:
             file_handler.setFormatter(formatter)
             self.logger.addHandler(file_handler)
 
-    def generate_audio_from_text(self, text: str, output_path: str) -> Optional[float]:
-        """Generate audio file from text. Returns duration in seconds, or None on failure."""
-        try:
-            self.logger.info(f"Generating audio for: '{text[:50]}...'")
-
+    def _synthesize(self, text: str, pipeline=None):
+        """Run Kokoro on text and return the concatenated 24kHz samples."""
+        if pipeline is None:
             # Initialize pipeline if not already done
             self._init_pipeline()
+            pipeline = self.pipeline
 
-            # Generate audio using Kokoro pipeline
-            # Collect all chunks from the generator and concatenate
-            generator = self.pipeline(text, voice=self.voice_name)
+        # Generate audio using Kokoro pipeline
+        # Collect all chunks from the generator and concatenate
+        generator = pipeline(text, voice=self.voice_name)
 
-            audio_chunks = []
+        audio_chunks = []
+        # No-op when the pipeline has no stream (CPU, TensorRT)
+        with torch.cuda.stream(getattr(pipeline, 'cuda_stream', None)):
             for i, (gs, ps, audio) in enumerate(generator):
                 audio_chunks.append(audio)
 
-            if not audio_chunks:
-                raise RuntimeError("No audio generated")
+        if not audio_chunks:
+            raise RuntimeError("No audio generated")
+
+        return _concat_chunks(audio_chunks)
+
+    def _synthesize_on_worker(self, text: str):
+        """Synthesize on the pipeline of the calling worker's slot."""
+        pipeline = self._cached_pipeline(self._thread_state.slot)
+
+        # Called once per segment/sentence unit: let logging format lazily
+        self.logger.info("Generating audio for: '%s...'", text[:50])
+        return self._synthesize(text, pipeline)
+
+    def _synthesize_tokens_on_worker(self, text: str) -> List[Tuple]:
+        """Run Kokoro on the calling worker's pipeline, keeping each chunk's (tokens, audio)."""
+        pipeline = self._cached_pipeline(self._thread_state.slot)
 
-            # Concatenate all audio chunks
-            audio_array = np.concatenate(audio_chunks) if len(audio_chunks) > 1 else audio_chunks[0]
+        self.logger.info("Generating audio for: '%s...'", text[:50])
+        with torch.cuda.stream(getattr(pipeline, 'cuda_stream', None)):
+            return [(getattr(result, 'tokens', None), result.audio)
+                    for result in pipeline(text, voice=self.voice_name)]
+
+    def _synthesis_pool(self, workers: int) -> ThreadPoolExecutor:
+        """Thread pool whose workers each claim their own pipeline slot."""
+        slots = itertools.count()
+
+        def claim_slot():
+            self._thread_state.slot = next(slots)
+
+        return ThreadPoolExecutor(max_workers=max(1, workers), initializer=claim_slot)
+
+    def generate_audio_from_text(self, text: str, output_path: str, workers: int = 2) -> Optional[float]:
+        """Generate audio file from text. Returns duration in seconds, or None on failure."""
+        audio_array = self._render_audio(text, output_path, workers)
+        return None if audio_array is None else len(audio_array) / SAMPLE_RATE
+
+    def _render_audio(self, text: str, output_path: str, workers: int = 2):
+        """Synthesize text and write it to output_path. Returns the 24kHz samples, or None on failure."""
+        try:
+            units = _sentence_units(text)
+            if len(units) <= 1 or workers <= 1:
+                self.logger.info(f"Generating audio for: '{text[:50]}...'")
+                audio_array = self._synthesize(text)
+            else:
+                # Kokoro's model only runs one sequence per forward pass, so sentence
+                # units are spread over `workers` pipelines and joined in order
+                with self._synthesis_pool(workers) as tts_pool:
+                    audio_array = _concat_chunks(list(tts_pool.map(self._synthesize_on_worker, units)))
 
             # Save audio file (Kokoro returns numpy array at 24kHz)
-            sf.write(output_path, audio_array, 24000)
+            sf.write(output_path, audio_array, SAMPLE_RATE, subtype=WAV_SUBTYPE)
 
-            duration = len(audio_array) / 24000
+            duration = len(audio_array) / SAMPLE_RATE
             self.logger.info(f"Audio generated: {output_path} (duration: {duration:.2f}s)")
 
-            return duration
+            return audio_array
         except Exception as e:
             self.logger.error(f"Failed to generate audio: {e}")
             return None
 
-    def generate_full_audio(self, json_path: str, output_dir: str) -> bool:
-        """Generate single audio file from all segments, transcribe, and output timestamps."""
+    def generate_full_audio(self, json_path: str, output_dir: str, workers: int = 2) -> bool:
+        """Generate single audio file from all segments and output word/segment timestamps."""
         try:
             # Load JSON configuration
             with open(json_path, 'r', encoding='utf-8') as f:
@@ -150,78 +529,32 @@ class AudioGenerator:
             full_text = " ".join(full_text_parts)
             self.logger.info(f"Full script: {len(full_text_parts)} segments, {cumulative_words} words")
 
-            # Step 2: Generate single audio file
             full_audio_path = os.path.join(output_dir, "full_audio.wav")
-            duration = self.generate_audio_from_text(full_text, full_audio_path)
-            if duration is None:
-                return False
-
-            self.logger.info(f"Full audio generated: {duration:.2f}s")
-
-            # Step 3: Transcribe with faster-whisper for word-level timestamps
-            self.logger.info("Transcribing audio for word-level timestamps...")
-            try:
-                from faster_whisper import WhisperModel
-            except ImportError:
-                self.logger.error("faster-whisper not installed. pip install faster-whisper")
-                return False
-
-            device = "cuda" if self.use_gpu else "cpu"
-            compute_type = "float16" if device == "cuda" else "int8"
-            model = WhisperModel("base", device=device, compute_type=compute_type)
+            timings_path = os.path.join(output_dir, "audio_timestamps.ndjson")
 
-            segments_iter, info = model.transcribe(
-                full_audio_path,
-                word_timestamps=True,
-                language="en",
-                vad_filter=True
-            )
-
-            word_timestamps = []
-            for segment in segments_iter:
-                if hasattr(segment, 'words') and segment.words:
-                    for word in segment.words:
-                        word_timestamps.append({
-                            'word': word.word.strip(),
-                            'start': round(word.start, 3),
-                            'end': round(word.end, 3)
-                        })
-
-            self.logger.info(f"Transcribed {len(word_timestamps)} words (expected {cumulative_words})")
-
-            if not word_timestamps:
-                self.logger.error("No words transcribed")
-                return False
+            # Step 2: Synthesize segment by segment, taking word timings from Kokoro
+            native = self._generate_with_native_timings(segment_word_boundaries, full_audio_path,
+                                                        timings_path, workers)
+            if native is not None:
+                duration, word_timestamps, segment_timings = native
+            else:
+                # Kokoro without token timestamps: one TTS pass, then Whisper for timings
+                audio_array = self._render_audio(full_text, full_audio_path, workers)
+                if audio_array is None:
+                    return False
+                duration = len(audio_array) / SAMPLE_RATE
 
-            # Step 4: Map words back to segments using cumulative word index
-            segment_timings = []
-            for boundary in segment_word_boundaries:
-                seg_start_idx = boundary['start_word_idx']
-                seg_end_idx = boundary['end_word_idx']
-
-                # Clamp to actual transcribed word count
-                seg_start_idx = min(seg_start_idx, len(word_timestamps) - 1)
-                seg_end_idx = min(seg_end_idx, len(word_timestamps) - 1)
-
-                start_time = word_timestamps[seg_start_idx]['start']
-                end_time = word_timestamps[seg_end_idx]['end']
-
-                segment_timings.append({
-                    'segment_id': boundary['segment_id'],
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'duration': round(end_time - start_time, 3),
-                    'word_start_idx': seg_start_idx,
-                    'word_end_idx': seg_end_idx
-                })
+                self.logger.info(f"Full audio generated: {duration:.2f}s")
 
-                self.logger.info(
-                    f"Segment {boundary['segment_id']}: "
-                    f"{start_time:.2f}s - {end_time:.2f}s "
-                    f"({end_time - start_time:.2f}s)"
+                # Step 3: Transcribe with faster-whisper for word-level timestamps
+                transcribed = self._transcribe_timings(
+                    audio_array, segment_word_boundaries, timings_path, cumulative_words
                 )
+                if transcribed is None:
+                    return False
+                word_timestamps, segment_timings = transcribed
 
-            # Step 5: Write timestamps JSON
+            # Step 4: Write timestamps JSON
             timestamps_data = {
                 'full_audio_path': 'full_audio.wav',
                 'total_duration': round(duration, 3),
@@ -230,8 +563,8 @@ class AudioGenerator:
             }
 
             timestamps_path = os.path.join(output_dir, "audio_timestamps.json")
-            with open(timestamps_path, 'w', encoding='utf-8') as f:
-                json.dump(timestamps_data, f, indent=2, ensure_ascii=False)
+            with open(timestamps_path, 'wb') as f:
+                f.write(json_dumps(timestamps_data))
 
             self.logger.info(f"Timestamps written: {timestamps_path}")
             self.logger.info(f"Full audio generation complete: {duration:.2f}s, {len(word_timestamps)} words")
@@ -243,7 +576,192 @@ class AudioGenerator:
             traceback.print_exc()
             return False
 
-    def generate_from_json(self, json_path: str, output_dir: str) -> bool:
+    def _generate_with_native_timings(self, segment_word_boundaries: List[Dict], full_audio_path: str,
+                                      timings_path: str, workers: int = 2
+                                      ) -> Optional[Tuple[float, List[Dict], List[Dict]]]:
+        """Synthesize each segment separately, taking word timings from Kokoro's tokens.
+
+        Segments run on `workers` pipeline slots and are stitched back in order;
+        each one's audio goes to the writer thread once its timing is known.
+        Segment boundaries are exact sample offsets and no ASR pass is needed.
+        Returns (duration, words, segment_timings), or None if this Kokoro
+        version doesn't report token timestamps (nothing is written then).
+        """
+        word_timestamps = []
+        segment_timings = []
+        total_samples = 0
+
+        with self._synthesis_pool(workers) as tts_pool:
+            syntheses = [
+                tts_pool.submit(self._synthesize_tokens_on_worker, boundary['text'])
+                for boundary in segment_word_boundaries
+            ]
+
+            first = syntheses[0].result()
+            tokens = first[0][0] if first else None
+            if tokens is None or all(t.start_ts is None for t in tokens):
+                # Old Kokoro, or a backend (TensorRT) that returns no durations
+                for synthesis in syntheses:
+                    synthesis.cancel()
+                return None
+
+            with open(timings_path, 'w', encoding='utf-8') as timings_file, \
+                    sf.SoundFile(full_audio_path, 'w', SAMPLE_RATE, 1, WAV_SUBTYPE) as audio_file, \
+                    ThreadPoolExecutor(max_workers=1) as writer:
+                writes = []
+                for boundary, synthesis in zip(segment_word_boundaries, syntheses):
+                    segment_start = total_samples
+                    word_start_idx = len(word_timestamps)
+                    audio_chunks = []
+
+                    for tokens, audio in synthesis.result():
+                        if audio is None:
+                            continue
+
+                        # Token timestamps are relative to the chunk they were spoken in
+                        chunk_start = total_samples / SAMPLE_RATE
+                        for token in tokens or []:
+                            if not any(c.isalnum() for c in token.text):
+                                # Punctuation rides on the preceding word, as in Whisper output
+                                if len(word_timestamps) > word_start_idx:
+                                    word_timestamps[-1]['word'] += token.text
+                                continue
+                            previous_end = word_timestamps[-1]['end'] - chunk_start if word_timestamps else 0.0
+                            start = token.start_ts if token.start_ts is not None else max(previous_end, 0.0)
+                            end = token.end_ts if token.end_ts is not None else start
+                            word_timestamps.append({
+                                'word': token.text,
+                                'start': round(chunk_start + start, 3),
+                                'end': round(chunk_start + end, 3)
+                            })
+
+                        audio_chunks.append(audio)
+                        total_samples += len(audio)
+
+                    if audio_chunks:
+                        writes.append(writer.submit(audio_file.write, _concat_chunks(audio_chunks)))
+
+                    # A segment with no word tokens (e.g. only punctuation or symbols) gets
+                    # an explicit empty range rather than end < start
+                    has_words = len(word_timestamps) > word_start_idx
+                    start_time = round(segment_start / SAMPLE_RATE, 3)
+                    end_time = round(total_samples / SAMPLE_RATE, 3)
+                    timing = {
+                        'segment_id': boundary['segment_id'],
+                        'start_time': start_time,
+                        'end_time': end_time,
+                        'duration': round(end_time - start_time, 3),
+                        'word_start_idx': word_start_idx if has_words else None,
+                        'word_end_idx': len(word_timestamps) - 1 if has_words else None
+                    }
+                    segment_timings.append(timing)
+                    self._write_segment_timing(timing, timings_file)
+
+                for write in writes:
+                    write.result()
+
+        if not total_samples:
+            raise RuntimeError("No audio generated")
+
+        duration = total_samples / SAMPLE_RATE
+        self.logger.info(f"Full audio generated: {duration:.2f}s, {len(word_timestamps)} words (Kokoro timings)")
+        return duration, word_timestamps, segment_timings
+
+    def _transcribe_timings(self, audio_array, segment_word_boundaries: List[Dict],
+                            timings_path: str, cumulative_words: int) -> Optional[Tuple[List[Dict], List[Dict]]]:
+        """Recover word and segment timings by transcribing the full 24kHz audio. None on failure."""
+        self.logger.info("Transcribing audio for word-level timestamps...")
+        if not self._init_whisper():
+            return None
+
+        # Transcribe the samples already in memory; faster-whisper would otherwise
+        # decode the WAV we just wrote through PyAV
+        audio = resample_poly(audio_array, WHISPER_SAMPLE_RATE, SAMPLE_RATE).astype(np.float32)
+
+        segments_iter, info = self.whisper.transcribe(
+            audio,
+            word_timestamps=True,
+            language="en",
+            vad_filter=True,
+            batch_size=WHISPER_BATCH_SIZE,
+            # Only word boundaries are needed, so greedy decoding is enough
+            beam_size=1,
+            best_of=1,
+            temperature=0
+        )
+
+        # Map words back to segments using cumulative word index.
+        # A segment's timing is final once transcription has passed its last
+        # word, so each one is appended to audio_timestamps.ndjson right away
+        # (the orchestrator starts that segment's b-roll fetch from it).
+        word_timestamps = []
+        segment_timings = []
+        with open(timings_path, 'w', encoding='utf-8') as timings_file:
+            for segment in segments_iter:
+                if hasattr(segment, 'words') and segment.words:
+                    for word in segment.words:
+                        word_timestamps.append({
+                            'word': word.word.strip(),
+                            'start': round(word.start, 3),
+                            'end': round(word.end, 3)
+                        })
+
+                while len(segment_timings) < len(segment_word_boundaries):
+                    boundary = segment_word_boundaries[len(segment_timings)]
+                    if max(boundary['start_word_idx'], boundary['end_word_idx']) >= len(word_timestamps):
+                        break
+                    self._emit_segment_timing(boundary, word_timestamps, segment_timings, timings_file)
+
+            self.logger.info(f"Transcribed {len(word_timestamps)} words (expected {cumulative_words})")
+
+            if not word_timestamps:
+                self.logger.error("No words transcribed")
+                return None
+
+            # Transcript came up short: clamp the remaining segments to the last word
+            for boundary in segment_word_boundaries[len(segment_timings):]:
+                self._emit_segment_timing(boundary, word_timestamps, segment_timings, timings_file)
+
+        return word_timestamps, segment_timings
+
+    def _emit_segment_timing(self, boundary: Dict, word_timestamps: List[Dict],
+                             segment_timings: List[Dict], timings_file):
+        """Compute a segment's timing from the words so far and append it to the ndjson stream."""
+        if boundary['end_word_idx'] < boundary['start_word_idx']:
+            # No words in the segment text: empty range, zero length at the previous segment's end
+            seg_start_idx = seg_end_idx = None
+            start_time = end_time = segment_timings[-1]['end_time'] if segment_timings else 0.0
+        else:
+            # Clamp to actual transcribed word count
+            seg_start_idx = min(boundary['start_word_idx'], len(word_timestamps) - 1)
+            seg_end_idx = min(boundary['end_word_idx'], len(word_timestamps) - 1)
+
+            start_time = word_timestamps[seg_start_idx]['start']
+            end_time = word_timestamps[seg_end_idx]['end']
+
+        timing = {
+            'segment_id': boundary['segment_id'],
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': round(end_time - start_time, 3),
+            'word_start_idx': seg_start_idx,
+            'word_end_idx': seg_end_idx
+        }
+        segment_timings.append(timing)
+        self._write_segment_timing(timing, timings_file)
+
+    def _write_segment_timing(self, timing: Dict, timings_file):
+        """Append one segment timing to the ndjson stream and flush it for the orchestrator."""
+        timings_file.write(json.dumps(timing) + '\n')
+        timings_file.flush()
+
+        self.logger.info(
+            "Segment %s: %.2fs - %.2fs (%.2fs)",
+            timing['segment_id'], timing['start_time'], timing['end_time'], timing['duration']
+        )
+
+    def generate_from_json(self, json_path: str, output_dir: str, workers: int = 2,
+                           direct_io: bool = False) -> bool:
         """Generate audio segments from JSON configuration (legacy per-segment mode)."""
         try:
             # Load JSON configuration
@@ -267,7 +785,7 @@ class AudioGenerator:
 
             self.logger.info(f"Generating {len(script_segments)} audio segments")
 
-            success_count = 0
+            jobs = []
             for segment in script_segments:
                 segment_id = segment.get('segment_id', 0)
                 audio_text = segment.get('audio_text', '')
@@ -277,11 +795,51 @@ class AudioGenerator:
                     continue
 
                 output_file = os.path.join(output_dir, f"segment_{segment_id:03d}.wav")
+                jobs.append((segment_id, audio_text, output_file))
 
-                if self.generate_audio_from_text(audio_text, output_file) is not None:
-                    success_count += 1
-                else:
-                    self.logger.error(f"Failed to generate audio for segment {segment_id}")
+            # Segments are independent: synthesize them on `workers` threads, each
+            # with its own Kokoro pipeline. WAV encode + write runs on one writer
+            # thread so no synthesis thread waits on the disk; at most
+            # WRITE_QUEUE_DEPTH segments of audio wait in memory for it.
+            success_count = 0
+            pending_writes = deque()
+
+            def finish_write():
+                segment_id, output_file, duration, write = pending_writes.popleft()
+                try:
+                    write.result()
+                except Exception as e:
+                    self.logger.error(f"Failed to write audio for segment {segment_id}: {e}")
+                    return 0
+                self.logger.info("Audio generated: %s (duration: %.2fs)", output_file, duration)
+                return 1
+
+            with self._synthesis_pool(workers) as tts_pool, \
+                    ThreadPoolExecutor(max_workers=1) as writer:
+                syntheses = {
+                    tts_pool.submit(self._synthesize_on_worker, audio_text): (segment_id, output_file)
+                    for segment_id, audio_text, output_file in jobs
+                }
+
+                for synthesis in as_completed(syntheses):
+                    segment_id, output_file = syntheses[synthesis]
+                    try:
+                        audio_array = synthesis.result()
+                    except Exception as e:
+                        self.logger.error(f"Failed to generate audio for segment {segment_id}: {e}")
+                        continue
+
+                    if len(pending_writes) >= WRITE_QUEUE_DEPTH:
+                        success_count += finish_write()
+                    if direct_io:
+                        write = writer.submit(_write_wav_direct, output_file, audio_array)
+                    else:
+                        write = writer.submit(sf.write, output_file, audio_array, SAMPLE_RATE,
+                                              subtype=WAV_SUBTYPE)
+                    pending_writes.append((segment_id, output_file, len(audio_array) / SAMPLE_RATE, write))
+
+                while pending_writes:
+                    success_count += finish_write()
 
             self.logger.info(f"Audio generation complete: {success_count}/{len(script_segments)} segments")
             return success_count == len(script_segments)
@@ -291,7 +849,7 @@ class AudioGenerator:
             return False
 
 
-def main():
+def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(description="Generate TTS audio using Kokoro-ONNX")
 
     # Mode selection
@@ -308,9 +866,24 @@ def main():
                         help='Generate single audio file from all segments with timestamps')
     parser.add_argument('--use-gpu', action='store_true', default=True, help='Use GPU acceleration (default: True)')
     parser.add_argument('--no-gpu', dest='use_gpu', action='store_false', help='Disable GPU acceleration')
+    parser.add_argument('--compile', dest='compile_model', action='store_true',
+                        help='torch.compile the Kokoro model (slow first start, faster synthesis)')
+    parser.add_argument('--backend', choices=['pytorch', 'trt'], default='pytorch',
+                        help='Kokoro inference backend (default: pytorch)')
+    parser.add_argument('--trt-engine', type=str, default=TRT_ENGINE_PATH,
+                        help=f'Serialized TensorRT engine for --backend trt (default: {TRT_ENGINE_PATH})')
+    parser.add_argument('--whisper-model', type=str, default=WHISPER_MODEL,
+                        help=f'faster-whisper model for timestamp fallback (default: {WHISPER_MODEL})')
+    parser.add_argument('--whisper-compute-type', type=str,
+                        help='CTranslate2 compute type for the Whisper model, e.g. int8, float16 '
+                             '(default: int8_float16 on GPU, int8 on CPU)')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Parallel Kokoro pipelines (default: 2)')
+    parser.add_argument('--direct-io', action='store_true',
+                        help='Write per-segment WAVs with O_DIRECT, bypassing the page cache (Linux)')
     parser.add_argument('--log-file', type=str, help='Path to log file')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Validate arguments
     if args.json and not args.output_dir:
@@ -324,26 +897,32 @@ def main():
         generator = AudioGenerator(
             voice_name=args.voice,
             use_gpu=args.use_gpu,
+            compile_model=args.compile_model,
+            backend=args.backend,
+            trt_engine=args.trt_engine,
+            whisper_model=args.whisper_model,
+            whisper_compute_type=args.whisper_compute_type,
             log_file=args.log_file
         )
 
         # Process based on mode
         if args.json:
             if args.full_audio:
-                success = generator.generate_full_audio(args.json, args.output_dir)
+                success = generator.generate_full_audio(args.json, args.output_dir, workers=args.workers)
             else:
-                success = generator.generate_from_json(args.json, args.output_dir)
+                success = generator.generate_from_json(args.json, args.output_dir, workers=args.workers,
+                                                       direct_io=args.direct_io)
         else:
             # Standalone mode
             os.makedirs(os.path.dirname(args.output) if os.path.dirname(args.output) else '.', exist_ok=True)
-            success = generator.generate_audio_from_text(args.text, args.output) is not None
+            success = generator.generate_audio_from_text(args.text, args.output, workers=args.workers) is not None
 
-        sys.exit(0 if success else 1)
+        return 0 if success else 1
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        return 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
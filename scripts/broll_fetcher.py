@@ -9,47 +9,247 @@ import argparse
 import json
 import logging
 import math
+import multiprocessing.util
 import os
 import random
+import shutil
+import sqlite3
+import subprocess
 import sys
+import threading
 import time
 import hashlib
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from itertools import cycle, islice
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
 
 try:
     import requests
-    from PIL import Image
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     import ffmpeg
 except ImportError as e:
     print(f"Error: Missing required package: {e}")
-    print("Install with: pip install requests Pillow ffmpeg-python")
+    print("Install with: pip install requests ffmpeg-python")
     sys.exit(1)
 
+from media_headers import read_mp4_dimensions, read_wav_duration
+
+# Optional: xxh3 hashes short keys much faster than sha256; both give a 16-hex-char
+# cache key. Nothing here needs a cryptographic hash
+try:
+    import xxhash
+
+    def _cache_key(text: str) -> str:
+        return xxhash.xxh3_64_hexdigest(text.encode())
+except ImportError:
+    def _cache_key(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+# Optional: httpx (with h2) multiplexes concurrent API searches over one HTTP/2
+# connection per host; the requests session is used otherwise
+try:
+    import httpx
+    import h2  # noqa: F401  (needed by httpx for http2=True)
+except ImportError:
+    httpx = None
+
+# Optional: zstd compresses cached search results smaller and faster than zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    """Compress a cache body, returning (codec, blob)."""
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(data)
+    return 'zlib', zlib.compress(data)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+# Clips of one segment in flight at once; each waits for a download slot, then an
+# encode slot, so later clips download while earlier ones encode
+CLIP_WORKERS = 16
+
+# Media downloads running at once per fetcher
+DOWNLOAD_WORKERS = 4
+
+# Threads per ffmpeg encode; concurrent encodes default to cores / this. A few narrow
+# encodes side by side keep the cores busier than one wide encode at a time
+ENCODE_THREADS = 2
+
+# API searches of one segment in flight at once (within the client's per-host pool)
+SEARCH_WORKERS = 8
+
+# Longest a search waits for its API's next rate-limit token before giving up
+# (and falling back to the other API)
+RATE_LIMIT_MAX_WAIT = 5.0
+
+# Read size when streaming media downloads to disk
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Downloads at least this large are split into byte ranges fetched in parallel;
+# the CDNs limit per-connection throughput
+RANGE_DOWNLOAD_MIN_BYTES = 16 * 1024 * 1024
+RANGE_DOWNLOAD_PARTS = 4
+
+# H.264 encoders in order of preference, with comparable quality settings. Clips
+# are re-encoded during assembly, so speed matters more than compression here.
+ENCODER_OPTIONS = {
+    'h264_nvenc': {'preset': 'p4', 'cq': 23},
+    'h264_qsv': {'preset': 'veryfast', 'global_quality': 23},
+    'h264_videotoolbox': {'b:v': '8M'},
+    'libx264': {'preset': 'veryfast', 'crf': 23},
+}
+
+
+@lru_cache(maxsize=None)
+def _detect_encoder() -> str:
+    """First H.264 encoder that can actually encode here (once per process)."""
+    for encoder in ENCODER_OPTIONS:
+        if encoder == 'libx264':
+            break
+        # Being listed by `ffmpeg -encoders` doesn't mean the device exists: try a tiny encode
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                 '-i', 'color=c=black:s=256x256:d=0.1', '-c:v', encoder, '-f', 'null', '-'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if result.returncode == 0:
+            return encoder
+    return 'libx264'
+
+
+def _center_crop(stream, width: int, height: int, scale_flags: str = 'bicubic'):
+    """Crop a stream to its largest centered region with the target aspect, then scale to it.
+
+    ffmpeg evaluates the crop against the input size, so nothing needs probing first.
+    """
+    return (
+        stream
+        .filter('crop', w=f'trunc(min(iw,ih*{width}/{height}))', h=f'trunc(min(ih,iw*{height}/{width}))')
+        .filter('scale', width, height, flags=scale_flags)
+    )
+
 
 class BRollFetcher:
-    def __init__(self, api_keys: Dict[str, str], cache_dir: str = ".cache", log_file: Optional[str] = None):
-        """Initialize b-roll fetcher with API credentials."""
+    def __init__(self, api_keys: Dict[str, str], cache_dir: str = ".cache", log_file: Optional[str] = None,
+                 encode_workers: Optional[int] = None):
+        """Initialize b-roll fetcher with API credentials.
+
+        encode_workers caps concurrent ffmpeg encodes (default: cores / ENCODE_THREADS).
+        """
         self.pexels_key = api_keys.get('pexels', '')
         self.pixabay_key = api_keys.get('pixabay', '')
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         self.setup_logging(log_file)
 
-        # API rate limiting
-        self.pexels_requests = []
-        self.pixabay_requests = []
+        # Search responses live in one SQLite table (WAL, so fetcher processes can
+        # read while another writes) with compressed bodies; clip workers share the
+        # connection under a lock
+        self.cache_db = sqlite3.connect(str(self.cache_dir / 'search_cache.db'), timeout=30,
+                                        isolation_level=None, check_same_thread=False)
+        self.cache_db.execute('PRAGMA journal_mode=WAL')
+        self.cache_db.execute(
+            'CREATE TABLE IF NOT EXISTS search_cache ('
+            'key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, expires_at REAL, '
+            'first_fetched REAL, changes INTEGER, codec TEXT, body BLOB)'
+        )
+        self._cache_lock = threading.Lock()
+
+        # Fresh search results already seen in this process, as (expires_at, results):
+        # repeated queries skip the SQLite read and decompression
+        self._mem_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+
+        # API rate limiting: one token bucket per API, [tokens, last refill time],
+        # starting full and refilling continuously at the hourly limit
         self.max_pexels_per_hour = 200
         self.max_pixabay_per_hour = 5000
+        self._bucket_caps = {'pexels': float(self.max_pexels_per_hour),
+                             'pixabay': float(self.max_pixabay_per_hour)}
+        self._buckets = {api: [cap, time.monotonic()] for api, cap in self._bucket_caps.items()}
+        self._rate_limit_lock = threading.Lock()  # Clip workers share the buckets
+
+        # One pooled session for all API and media requests: keep-alive reuses the
+        # TCP+TLS connection to each host, and transient errors are retried
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=frozenset({'GET'}))
+        # Sized so the busiest host (a CDN during ranged downloads) never discards connections
+        pool_size = max(SEARCH_WORKERS, DOWNLOAD_WORKERS * RANGE_DOWNLOAD_PARTS)
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry))
+        # Pexels auth is sent per request so the key never reaches Pixabay or the media CDNs
+        self.pexels_headers = {"Authorization": self.pexels_key}
+
+        # Searches of a segment all go to the same two API hosts at once; over HTTP/2
+        # they share one connection per host instead of queueing for pooled ones.
+        # httpx only retries connection errors, status retries stay with requests
+        if httpx is not None:
+            self.api_client = httpx.Client(
+                http2=True, timeout=10.0,
+                transport=httpx.HTTPTransport(
+                    http2=True, retries=3,
+                    limits=httpx.Limits(max_connections=8, max_keepalive_connections=8)
+                )
+            )
+        else:
+            self.api_client = self.session
+
+        # Encoder detection runs test encodes: deferred to the first encode (see encoder)
+        self._encoder_lock = threading.Lock()
+
+        # Clip workers hold a slot while downloading / encoding: network and CPU are
+        # bounded separately
+        self._download_slots = threading.BoundedSemaphore(DOWNLOAD_WORKERS)
+        self._encode_slots = threading.BoundedSemaphore(
+            encode_workers or max(1, (os.cpu_count() or 1) // ENCODE_THREADS)
+        )
+
+        # ffprobe results keyed by (path, mtime_ns, size); each probe is a subprocess
+        self._probe_cache: Dict[Tuple[str, int, int], Dict] = {}
 
         self.logger.info("B-Roll Fetcher initialized")
 
+    @cached_property
+    def encoder(self) -> str:
+        """H.264 encoder for clips, detected on first use so search-only runs skip the test encodes."""
+        with self._encoder_lock:  # Concurrent first encodes detect once
+            encoder = _detect_encoder()
+        self.logger.info(f"Using encoder: {encoder}")
+        return encoder
+
+    def close(self):
+        """Close the cache database and HTTP connections (main() may run many times per process)."""
+        if self.api_client is not self.session:
+            self.api_client.close()
+        self.session.close()
+        with self._cache_lock:
+            self.cache_db.close()
+
     def setup_logging(self, log_file: Optional[str] = None):
         """Configure logging."""
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
 
+        # main() may run repeatedly in one process; drop handlers from earlier runs
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
@@ -62,139 +262,242 @@ class BRollFetcher:
             file_handler.setFormatter(formatter)
             self.logger.addHandler(file_handler)
 
-    def _check_rate_limit(self, api: str) -> bool:
-        """Check if we're within API rate limits."""
-        now = datetime.now()
-        one_hour_ago = now - timedelta(hours=1)
+    def _check_rate_limit(self, api: str, max_wait: float = 0.0) -> bool:
+        """Check if we're within API rate limits, taking a token if so.
 
-        if api == 'pexels':
-            self.pexels_requests = [req for req in self.pexels_requests if req > one_hour_ago]
-            if len(self.pexels_requests) >= self.max_pexels_per_hour:
-                self.logger.warning(f"Pexels rate limit reached ({self.max_pexels_per_hour}/hour)")
-                return False
-            self.pexels_requests.append(now)
-        elif api == 'pixabay':
-            self.pixabay_requests = [req for req in self.pixabay_requests if req > one_hour_ago]
-            if len(self.pixabay_requests) >= self.max_pixabay_per_hour:
-                self.logger.warning(f"Pixabay rate limit reached ({self.max_pixabay_per_hour}/hour)")
+        When the bucket is empty but the next token is due within max_wait seconds,
+        the token is reserved and the call sleeps until then instead of failing.
+        """
+        cap = self._bucket_caps.get(api)
+        if cap is None:
+            return True
+
+        with self._rate_limit_lock:
+            bucket = self._buckets[api]
+            now = time.monotonic()
+            bucket[0] = min(cap, bucket[0] + (now - bucket[1]) * cap / 3600)
+            bucket[1] = now
+            # Reserved tokens leave the bucket negative, queueing later callers behind them
+            wait = max(0.0, (1 - bucket[0]) * 3600 / cap)
+            if wait > max_wait:
+                self.logger.warning(f"{api.capitalize()} rate limit reached ({int(cap)}/hour)")
                 return False
-            self.pixabay_requests.append(now)
+            bucket[0] -= 1
 
+        if wait:
+            time.sleep(wait)
         return True
 
-    def _get_cache_path(self, query: str, media_type: str) -> Path:
-        """Generate cache file path for API response."""
-        cache_key = hashlib.md5(f"{query}_{media_type}".encode()).hexdigest()
-        return self.cache_dir / f"{cache_key}.json"
+    def _cache_get(self, key: str) -> Optional[Dict]:
+        """Load a cached search entry, or None if there is no usable one."""
+        with self._cache_lock:
+            row = self.cache_db.execute(
+                'SELECT etag, last_modified, expires_at, first_fetched, changes, codec, body '
+                'FROM search_cache WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
 
-    def _is_cache_valid(self, cache_path: Path, max_age_hours: int = 24) -> bool:
-        """Check if cached API response is still valid."""
-        if not cache_path.exists():
-            return False
+        etag, last_modified, expires_at, first_fetched, changes, codec, blob = row
+        try:
+            body = json.loads(_decompress(codec, blob))
+        except Exception:
+            return None  # e.g. a zstd entry read without zstandard installed
+        return {'etag': etag, 'last_modified': last_modified, 'expires_at': expires_at,
+                'first_fetched': first_fetched, 'changes': changes, 'body': body}
+
+    def _cache_ttl_hours(self, entry: Dict) -> float:
+        """Freshness window for an entry: 24h, shortened for queries whose results keep changing."""
+        changes = entry.get('changes', 0)
+        if not changes:
+            return 24
+        mean_change_interval = (time.time() - entry['first_fetched']) / changes
+        return min(24, 2 * mean_change_interval / 3600)
+
+    def _cache_put(self, key: str, entry: Dict):
+        """Store a search entry, fresh for its TTL from now."""
+        codec, blob = _compress(json.dumps(entry['body']).encode('utf-8'))
+        expires_at = time.time() + self._cache_ttl_hours(entry) * 3600
+        with self._cache_lock:
+            self.cache_db.execute(
+                'INSERT OR REPLACE INTO search_cache '
+                '(key, etag, last_modified, expires_at, first_fetched, changes, codec, body) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, entry['etag'], entry['last_modified'], expires_at,
+                 entry['first_fetched'], entry['changes'], codec, blob)
+            )
+        self._mem_cache[key] = (expires_at, entry['body'])
 
-        age = datetime.now() - datetime.fromtimestamp(cache_path.stat().st_mtime)
-        return age < timedelta(hours=max_age_hours)
+    def _cache_refresh(self, key: str, entry: Dict):
+        """Mark a revalidated (304) entry fresh for another TTL."""
+        expires_at = time.time() + self._cache_ttl_hours(entry) * 3600
+        with self._cache_lock:
+            self.cache_db.execute('UPDATE search_cache SET expires_at = ? WHERE key = ?', (expires_at, key))
+        self._mem_cache[key] = (expires_at, entry['body'])
 
-    def search_pexels(self, query: str, media_type: str = "video", per_page: int = 15) -> List[Dict]:
-        """Search Pexels API for videos or images."""
-        if not self.pexels_key:
-            self.logger.error("Pexels API key not found")
-            return []
+    def _cached_search(self, api: str, query: str, media_type: str, url: str, params: Dict,
+                       results_key: str, headers: Optional[Dict] = None) -> List[Dict]:
+        """Run an API search through the response cache.
 
-        # Check cache first
-        cache_path = self._get_cache_path(f"pexels_{query}", media_type)
-        if self._is_cache_valid(cache_path):
-            self.logger.info(f"Using cached Pexels results for '{query}'")
-            with open(cache_path, 'r') as f:
-                return json.load(f)
+        Fresh entries are returned directly. Stale ones are revalidated with
+        If-None-Match / If-Modified-Since, and a 304 reuses the cached body.
+        """
+        name = api.capitalize()
+        # per_page is part of the key: a larger page must not be served a smaller cached one
+        key = _cache_key(f"{api}_{query}_{media_type}_{params['per_page']}")
+        cached = self._mem_cache.get(key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+
+        entry = self._cache_get(key)
+        if entry is not None and entry['expires_at'] > time.time():
+            self.logger.info(f"Using cached {name} results for '{query}'")
+            self._mem_cache[key] = (entry['expires_at'], entry['body'])
+            return entry['body']
 
         # Check rate limit
-        if not self._check_rate_limit('pexels'):
+        if not self._check_rate_limit(api, max_wait=RATE_LIMIT_MAX_WAIT):
             return []
 
         try:
-            if media_type == "video":
-                url = "https://api.pexels.com/videos/search"
-            else:
-                url = "https://api.pexels.com/v1/search"
+            request_headers = dict(headers or {})
+            if entry is not None:
+                if entry.get('etag'):
+                    request_headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    request_headers['If-Modified-Since'] = entry['last_modified']
 
-            headers = {"Authorization": self.pexels_key}
-            params = {"query": query, "per_page": per_page, "orientation": "portrait"}
+            self.logger.info(f"Searching {name} for '{query}' ({media_type})")
+            response = self.api_client.get(url, headers=request_headers, params=params, timeout=10)
+
+            if response.status_code == 304 and entry is not None:
+                self._cache_refresh(key, entry)
+                self.logger.info(f"{name} results unchanged for '{query}'")
+                return entry['body']
 
-            self.logger.info(f"Searching Pexels for '{query}' ({media_type})")
-            response = requests.get(url, headers=headers, params=params, timeout=10)
             response.raise_for_status()
+            results = response.json().get(results_key, [])
 
-            data = response.json()
-            results = data.get('videos' if media_type == "video" else 'photos', [])
+            now = time.time()
+            changes = entry.get('changes', 0) if entry else 0
+            if entry is not None and results != entry['body']:
+                changes += 1
 
             # Cache results
-            with open(cache_path, 'w') as f:
-                json.dump(results, f)
-
-            self.logger.info(f"Found {len(results)} results on Pexels")
+            self._cache_put(key, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'first_fetched': entry.get('first_fetched', now) if entry else now,
+                'changes': changes,
+                'body': results
+            })
+
+            self.logger.info(f"Found {len(results)} results on {name}")
             return results
 
         except Exception as e:
-            self.logger.error(f"Pexels API error: {e}")
+            self.logger.error(f"{name} API error: {e}")
             return []
 
+    def search_pexels(self, query: str, media_type: str = "video", per_page: int = 15) -> List[Dict]:
+        """Search Pexels API for videos or images."""
+        if not self.pexels_key:
+            self.logger.error("Pexels API key not found")
+            return []
+
+        if media_type == "video":
+            url = "https://api.pexels.com/videos/search"
+        else:
+            url = "https://api.pexels.com/v1/search"
+
+        params = {"query": query, "per_page": per_page, "orientation": "portrait"}
+        return self._cached_search('pexels', query, media_type, url, params,
+                                   'videos' if media_type == "video" else 'photos',
+                                   headers=self.pexels_headers)
+
     def search_pixabay(self, query: str, media_type: str = "video", per_page: int = 15) -> List[Dict]:
         """Search Pixabay API for videos or images."""
         if not self.pixabay_key:
             self.logger.error("Pixabay API key not found")
             return []
 
-        # Check cache first
-        cache_path = self._get_cache_path(f"pixabay_{query}", media_type)
-        if self._is_cache_valid(cache_path):
-            self.logger.info(f"Using cached Pixabay results for '{query}'")
-            with open(cache_path, 'r') as f:
-                return json.load(f)
-
-        # Check rate limit
-        if not self._check_rate_limit('pixabay'):
-            return []
-
-        try:
-            url = "https://pixabay.com/api/videos/" if media_type == "video" else "https://pixabay.com/api/"
-            params = {
-                "key": self.pixabay_key,
-                "q": query,
-                "per_page": per_page,
-                "orientation": "vertical"
-            }
-
-            self.logger.info(f"Searching Pixabay for '{query}' ({media_type})")
-            response = requests.get(url, params=params, timeout=10)
+        url = "https://pixabay.com/api/videos/" if media_type == "video" else "https://pixabay.com/api/"
+        params = {
+            "key": self.pixabay_key,
+            "q": query,
+            "per_page": per_page,
+            "orientation": "vertical"
+        }
+        return self._cached_search('pixabay', query, media_type, url, params, 'hits')
+
+    @staticmethod
+    def _write_range(response, fd: int, start: int, end: int):
+        """Write bytes start..end (inclusive) of a streaming response body to the same offsets of fd."""
+        offset = start
+        while offset <= end:
+            chunk = response.raw.read(min(DOWNLOAD_CHUNK_BYTES, end + 1 - offset))
+            if not chunk:
+                raise IOError(f"Range {start}-{end} ended at byte {offset}")
+            os.pwrite(fd, chunk, offset)
+            offset += len(chunk)
+
+    def _download_range(self, url: str, fd: int, start: int, end: int):
+        """Fetch bytes start..end (inclusive) of url into the same offsets of fd."""
+        with self.session.get(url, headers={'Range': f'bytes={start}-{end}'}, stream=True, timeout=30) as response:
             response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError(f"Range request answered with {response.status_code}")
+            self._write_range(response, fd, start, end)
 
-            data = response.json()
-            results = data.get('hits', [])
+    def _download_ranges(self, response, output_path: str, size: int):
+        """Finish a download as RANGE_DOWNLOAD_PARTS parallel byte ranges into a preallocated file.
 
-            # Cache results
-            with open(cache_path, 'w') as f:
-                json.dump(results, f)
-
-            self.logger.info(f"Found {len(results)} results on Pixabay")
-            return results
+        The already open full-body response supplies the first range; the rest are
+        separate Range requests.
+        """
+        part = math.ceil(size / RANGE_DOWNLOAD_PARTS)
+        bounds = [(start, min(start + part, size) - 1) for start in range(0, size, part)]
 
-        except Exception as e:
-            self.logger.error(f"Pixabay API error: {e}")
-            return []
+        fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(max_workers=len(bounds)) as executor:
+                first = executor.submit(self._write_range, response, fd, *bounds[0])
+                rest = [executor.submit(self._download_range, response.url, fd, *b) for b in bounds[1:]]
+                for future in [first] + rest:
+                    future.result()
+        finally:
+            os.close(fd)
+            response.close()  # Stops the first body mid-stream
 
     def download_media(self, url: str, output_path: str) -> bool:
         """Download media file from URL."""
         try:
             self.logger.info(f"Downloading: {url}")
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
-
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+            response = self.session.get(url, stream=True, timeout=30)
+            response.raise_for_status()
+
+            # Large files from servers that accept ranges come down over several
+            # connections; the size is only known from this response's headers
+            size = int(response.headers.get('Content-Length', 0))
+            if (hasattr(os, 'pwrite') and size >= RANGE_DOWNLOAD_MIN_BYTES
+                    and response.headers.get('Accept-Ranges') == 'bytes'
+                    and not response.headers.get('Content-Encoding')):
+                try:
+                    self._download_ranges(response, output_path, size)
+                    self.logger.info(f"Downloaded: {output_path} ({RANGE_DOWNLOAD_PARTS} ranges)")
+                    return True
+                except Exception as e:
+                    self.logger.warning(f"Ranged download failed, retrying as one stream: {e}")
+                    response = self.session.get(url, stream=True, timeout=30)
+                    response.raise_for_status()
+
+            # Copy straight from the socket in large blocks instead of iterating small chunks
+            response.raw.decode_content = True
             with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+                shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_BYTES)
 
             self.logger.info(f"Downloaded: {output_path}")
             return True
@@ -203,6 +506,73 @@ class BRollFetcher:
             self.logger.error(f"Download failed: {e}")
             return False
 
+    def download_media_bytes(self, url: str) -> Optional[bytes]:
+        """Download a media file into memory, or None on failure (photos, which are small)."""
+        try:
+            self.logger.info(f"Downloading: {url}")
+            response = self.session.get(url, timeout=30)
+            response.raise_for_status()
+            return response.content
+
+        except Exception as e:
+            self.logger.error(f"Download failed: {e}")
+            return None
+
+    def _probe(self, path: str) -> Dict:
+        """ffmpeg.probe, reusing the result while the file is unchanged."""
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size)
+        probe = self._probe_cache.get(key)
+        if probe is None:
+            probe = ffmpeg.probe(path)
+            self._probe_cache[key] = probe
+        return probe
+
+    def _encode(self, stream, output_path: str, input_data: Optional[bytes] = None, **output_kwargs):
+        """Encode to H.264 at 30fps with the detected encoder.
+
+        input_data is fed to ffmpeg's stdin for 'pipe:' inputs. Hardware encoders can
+        run out of sessions when many clips encode at once, so a failed hardware
+        encode is retried with libx264.
+        """
+        for encoder in dict.fromkeys((self.encoder, 'libx264')):
+            output = ffmpeg.output(stream, output_path,
+                                   vcodec=encoder,
+                                   r=30,  # Force 30fps for consistency
+                                   threads=ENCODE_THREADS,
+                                   movflags='faststart',
+                                   loglevel='error',
+                                   **ENCODER_OPTIONS[encoder],
+                                   **output_kwargs)
+            try:
+                with self._encode_slots:
+                    ffmpeg.run(output, input=input_data, overwrite_output=True)
+                return
+            except ffmpeg.Error:
+                if encoder == 'libx264':
+                    raise
+                self.logger.warning(f"{encoder} encode failed, retrying with libx264")
+
+    def _matches_output(self, input_path: str, width: int, height: int) -> bool:
+        """Whether the source video already is what _encode would produce (H.264, target size, 30fps)."""
+        # Most sources differ in size, which the MP4 header tells without an ffprobe process
+        try:
+            dims = read_mp4_dimensions(input_path)
+        except OSError:
+            dims = None
+        if dims is not None and sorted(dims) != sorted((width, height)):
+            return False
+
+        try:
+            video_info = next(s for s in self._probe(input_path)['streams'] if s['codec_type'] == 'video')
+        except Exception:
+            return False
+
+        rotated = any(side_data.get('rotation') for side_data in video_info.get('side_data_list', []))
+        return (video_info.get('codec_name') == 'h264' and video_info.get('pix_fmt') == 'yuv420p'
+                and video_info.get('width') == width and video_info.get('height') == height
+                and video_info.get('avg_frame_rate') == '30/1' and not rotated)
+
     def process_video(self, input_path: str, output_path: str, target_resolution: Tuple[int, int],
                       target_duration: Optional[float] = None, speed_factor: float = 1.0) -> bool:
         """Process video: crop/scale to target resolution and adjust speed."""
@@ -210,57 +580,39 @@ class BRollFetcher:
             width, height = target_resolution
             self.logger.info(f"Processing video: {input_path} -> {width}x{height}")
 
-            # Probe input video
-            probe = ffmpeg.probe(input_path)
-            video_info = next(s for s in probe['streams'] if s['codec_type'] == 'video')
-            input_width = int(video_info['width'])
-            input_height = int(video_info['height'])
-
-            # Calculate crop/scale parameters
-            input_aspect = input_width / input_height
-            target_aspect = width / height
-
-            if input_aspect > target_aspect:
-                # Input is wider, crop width
-                scale_height = input_height
-                scale_width = int(scale_height * target_aspect)
-                crop_x = (input_width - scale_width) // 2
-                crop_y = 0
-            else:
-                # Input is taller, crop height
-                scale_width = input_width
-                scale_height = int(scale_width / target_aspect)
-                crop_x = 0
-                crop_y = (input_height - scale_height) // 2
-
-            # Build FFmpeg filter chain
-            stream = ffmpeg.input(input_path)
+            # Without a speed change, a source that already matches the output format is
+            # only trimmed and remuxed. The probe is skipped otherwise: it can't pay off
+            if speed_factor == 1.0 and self._matches_output(input_path, width, height):
+                copy_kwargs = {'t': target_duration} if target_duration else {}
+                output = ffmpeg.output(ffmpeg.input(input_path).video, output_path, vcodec='copy',
+                                       movflags='faststart', loglevel='error', **copy_kwargs)
+                ffmpeg.run(output, overwrite_output=True)
+                self.logger.info(f"Video already {width}x{height} H.264, stream copied: {output_path}")
+                return True
+
+            # Limit decoding to the source span the clip needs (target duration at the
+            # sped-up rate) with -t on the input, instead of decoding it all and trimming
+            input_kwargs = {}
+            output_kwargs = {}
+            if target_duration:
+                input_kwargs['t'] = target_duration * speed_factor
+                # -t on the output as well keeps the exact duration (ensures precise sync)
+                output_kwargs['t'] = target_duration
+                self.logger.info(f"Trimming to exact duration: {target_duration:.2f}s")
 
-            video_stream = stream.video
+            # Build FFmpeg filter chain: speed, crop, scale in one graph
+            video_stream = ffmpeg.input(input_path, **input_kwargs).video
 
             # Apply speed adjustment if needed
             if speed_factor != 1.0:
                 video_stream = video_stream.filter('setpts', f'{1/speed_factor}*PTS')
                 self.logger.info(f"Applying speed factor: {speed_factor:.2f}x")
 
-            # Crop and scale
-            video_stream = video_stream.filter('crop', scale_width, scale_height, crop_x, crop_y)
-            video_stream = video_stream.filter('scale', width, height)
-
-            # ALWAYS trim to exact target duration if specified (ensures precise sync)
-            if target_duration:
-                video_stream = video_stream.trim(duration=target_duration).setpts('PTS-STARTPTS')
-                self.logger.info(f"Trimming to exact duration: {target_duration:.2f}s")
+            # Crop/scale in the same graph: no separate ffprobe process per clip
+            video_stream = _center_crop(video_stream, width, height)
 
             # Output with constant frame rate for better concatenation compatibility
-            stream = ffmpeg.output(video_stream, output_path,
-                                   vcodec='libx264',
-                                   crf=23,
-                                   preset='medium',
-                                   r=30,  # Force 30fps for consistency
-                                   movflags='faststart',
-                                   loglevel='error')
-            ffmpeg.run(stream, overwrite_output=True)
+            self._encode(video_stream, output_path, **output_kwargs)
 
             self.logger.info(f"Video processed: {output_path}")
             return True
@@ -269,42 +621,19 @@ class BRollFetcher:
             self.logger.error(f"Video processing failed: {e}")
             return False
 
-    def process_image(self, input_path: str, output_path: str, target_resolution: Tuple[int, int],
+    def process_image(self, source: Union[str, bytes], output_path: str, target_resolution: Tuple[int, int],
                       target_duration: Optional[float] = None) -> bool:
         """Process image: crop/scale to target resolution and convert to video clip.
 
-        Always outputs an .mp4 video (still frame) so the assembler can concatenate it
-        with other video clips seamlessly.
+        The source is a file path or the downloaded file's bytes. Always outputs an
+        .mp4 video (still frame) so the assembler can concatenate it with other video
+        clips seamlessly.
         """
         try:
             width, height = target_resolution
-            self.logger.info(f"Processing image: {input_path} -> {width}x{height}")
-
-            # First crop/scale the image
-            with Image.open(input_path) as img:
-                img = img.convert('RGB')
-                input_width, input_height = img.size
-
-                input_aspect = input_width / input_height
-                target_aspect = width / height
-
-                if input_aspect > target_aspect:
-                    new_width = int(input_height * target_aspect)
-                    left = (input_width - new_width) // 2
-                    box = (left, 0, left + new_width, input_height)
-                else:
-                    new_height = int(input_width / target_aspect)
-                    top = (input_height - new_height) // 2
-                    box = (0, top, input_width, top + new_height)
+            source_name = f"{len(source)} bytes" if isinstance(source, bytes) else source
+            self.logger.info(f"Processing image: {source_name} -> {width}x{height}")
 
-                img = img.crop(box)
-                img = img.resize((width, height), Image.Resampling.LANCZOS)
-
-                # Save processed image to temp file
-                temp_img = output_path.replace('.mp4', '_img.jpg')
-                img.save(temp_img, quality=95)
-
-            # Convert still image to video clip using FFmpeg
             duration = target_duration if target_duration else 3.0
             self.logger.info(f"Converting image to {duration:.2f}s video clip")
 
@@ -312,20 +641,15 @@ class BRollFetcher:
             if not output_path.endswith('.mp4'):
                 output_path = output_path.rsplit('.', 1)[0] + '.mp4'
 
-            stream = ffmpeg.input(temp_img, loop=1, t=duration, framerate=30)
-            stream = ffmpeg.output(stream, output_path,
-                                   vcodec='libx264',
-                                   crf=23,
-                                   preset='medium',
-                                   r=30,
-                                   pix_fmt='yuv420p',
-                                   movflags='faststart',
-                                   loglevel='error')
-            ffmpeg.run(stream, overwrite_output=True)
-
-            # Cleanup temp image
-            if os.path.exists(temp_img):
-                os.remove(temp_img)
+            # One ffmpeg run decodes the photo, crops/scales it once, and repeats that
+            # frame for the clip's duration: no intermediate image file
+            if isinstance(source, bytes):
+                stream = ffmpeg.input('pipe:', format='image2pipe', framerate=30)
+            else:
+                stream = ffmpeg.input(source, framerate=30)
+            stream = _center_crop(stream, width, height, 'lanczos').filter('loop', loop=-1, size=1)
+            self._encode(stream, output_path, input_data=source if isinstance(source, bytes) else None,
+                         t=duration, pix_fmt='yuv420p')
 
             self.logger.info(f"Image converted to video: {output_path}")
             return True
@@ -336,18 +660,13 @@ class BRollFetcher:
 
     def _expand_search_queries(self, broll_clips: List[Dict], num_needed: int) -> List[Dict]:
         """Expand clip list by generating query variations when more clips are needed."""
-        expanded = list(broll_clips)
         suffixes = ['cinematic', 'aerial', 'close up', 'dramatic', 'slow motion',
                      'abstract', 'nature', 'urban', 'texture', 'background']
-        idx = 0
-        while len(expanded) < num_needed:
-            base_clip = broll_clips[idx % len(broll_clips)]
-            variation = dict(base_clip)
-            suffix = suffixes[(len(expanded) - len(broll_clips)) % len(suffixes)]
-            variation['search_query'] = f"{base_clip['search_query']} {suffix}"
-            expanded.append(variation)
-            idx += 1
-        return expanded[:num_needed]
+        # Variation i pairs clip i % len(clips) with suffix i % len(suffixes)
+        variations = islice(zip(cycle(broll_clips), cycle(suffixes)), max(0, num_needed - len(broll_clips)))
+        expanded = list(broll_clips[:num_needed])
+        expanded.extend({**clip, 'search_query': f"{clip['search_query']} {suffix}"} for clip, suffix in variations)
+        return expanded
 
     def _get_download_url(self, media_item: Dict, clip_type: str) -> Optional[str]:
         """Extract download URL from API result item."""
@@ -367,16 +686,110 @@ class BRollFetcher:
                 return media_item['largeImageURL']
         return None
 
-    def _search_with_fallback(self, query: str, clip_type: str, result_index: int = 0) -> Optional[Dict]:
-        """Search Pexels then Pixabay, return a single result item."""
+    def _search_with_fallback(self, query: str, clip_type: str) -> List[Dict]:
+        """Search Pexels then Pixabay, return the result items."""
         results = self.search_pexels(query, clip_type)
         if not results:
             results = self.search_pixabay(query, clip_type)
+        return results
+
+    def _search_all(self, clips: List[Dict]) -> Dict[Tuple[str, str], List[Dict]]:
+        """Run every distinct (query, type) search of the clips concurrently.
+
+        All round-trips overlap on the pooled session before any download starts.
+        """
+        queries = list(dict.fromkeys(
+            (clip['search_query'], clip.get('type', 'video')) for clip in clips if clip.get('search_query')
+        ))
+        if not queries:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(len(queries), SEARCH_WORKERS)) as executor:
+            results = executor.map(lambda q: self._search_with_fallback(*q), queries)
+            return dict(zip(queries, results))
+
+    def prefetch_for_segment(self, config: Dict, segment_id: int) -> bool:
+        """Run the API searches for a segment's clips so later fetches hit the cache.
+
+        Needs no segment duration, so it can run while audio is still being generated.
+        """
+        try:
+            script_segments = config.get('script_segments', [])
+            segment = next((s for s in script_segments if s['segment_id'] == segment_id), None)
+
+            if not segment:
+                self.logger.error(f"Segment {segment_id} not found in config")
+                return False
+
+            found = sum(1 for results in self._search_all(segment.get('broll_clips', [])).values() if results)
+
+            self.logger.info(f"Prefetched {found} searches for segment {segment_id}")
+            return found > 0
+
+        except Exception as e:
+            self.logger.error(f"Error prefetching b-roll searches for segment: {e}")
+            return False
+
+    def _fetch_one_clip(self, segment_id: int, idx: int, clip: Dict, output_dir: str,
+                        resolution: Tuple[int, int], clip_display_duration: float,
+                        speed_range: Tuple[float, float],
+                        search_results: Dict[Tuple[str, str], List[Dict]]) -> bool:
+        """Download and process one b-roll clip of a segment from its search results."""
+        clip_type = clip.get('type', 'video')
+        search_query = clip.get('search_query', '')
+
+        if not search_query:
+            self.logger.warning(f"Clip {idx} has no search_query, skipping")
+            return False
+
+        results = search_results.get((search_query, clip_type))
         if not results:
-            return None
-        # Use result_index to get different results from same query
-        idx = result_index % len(results)
-        return results[idx]
+            self.logger.error(f"No results found for '{search_query}'")
+            return False
+
+        # Use idx to get different results from same query
+        media_item = results[idx % len(results)]
+
+        download_url = self._get_download_url(media_item, clip_type)
+        if not download_url:
+            self.logger.error(f"Could not extract download URL for '{search_query}'")
+            return False
+
+        if clip_type == 'video':
+            # Download video
+            temp_file = os.path.join(output_dir, f"segment_{segment_id:03d}_clip_{idx:03d}_temp.mp4")
+            with self._download_slots:
+                downloaded = self.download_media(download_url, temp_file)
+            if not downloaded:
+                return False
+
+            # Apply random speed factor for more dynamic feel
+            speed_factor = random.uniform(speed_range[0], speed_range[1])
+
+            output_file = os.path.join(output_dir, f"segment_{segment_id:03d}_clip_{idx:03d}.mp4")
+            if self.process_video(temp_file, output_file, resolution, clip_display_duration, speed_factor):
+                os.remove(temp_file)
+                return True
+
+            self.logger.error(f"Failed to process video clip {idx}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return False
+
+        else:  # image
+            # Photos are decoded straight from the downloaded bytes, with no temp file
+            with self._download_slots:
+                image_data = self.download_media_bytes(download_url)
+            if image_data is None:
+                return False
+
+            # Output as .mp4 (still frame converted to video) so assembler can concatenate
+            output_file = os.path.join(output_dir, f"segment_{segment_id:03d}_clip_{idx:03d}.mp4")
+            if self.process_image(image_data, output_file, resolution, clip_display_duration):
+                return True
+
+            self.logger.error(f"Failed to process image clip {idx}")
+            return False
 
     def fetch_for_segment(self, config: Dict, segment_id: int, output_dir: str,
                           resolution: Tuple[int, int], segment_duration: Optional[float] = None,
@@ -387,14 +800,19 @@ class BRollFetcher:
         try:
             # Get segment duration from audio file if not provided directly
             if segment_duration is None and audio_dir:
-                audio_file = Path(audio_dir) / f"segment_{segment_id:03d}.wav"
-                if audio_file.exists():
-                    try:
-                        probe = ffmpeg.probe(str(audio_file))
+                audio_file = str(Path(audio_dir) / f"segment_{segment_id:03d}.wav")
+                try:
+                    # RIFF header first; ffprobe only for WAVs it can't parse. A missing
+                    # file surfaces as FileNotFoundError, with no separate exists() check
+                    segment_duration = read_wav_duration(audio_file)
+                    if segment_duration is None:
+                        probe = self._probe(audio_file)
                         segment_duration = float(probe['format']['duration'])
-                        self.logger.info(f"Target duration from audio: {segment_duration:.2f}s")
-                    except Exception as e:
-                        self.logger.warning(f"Could not read audio duration: {e}")
+                    self.logger.info(f"Target duration from audio: {segment_duration:.2f}s")
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    self.logger.warning(f"Could not read audio duration: {e}")
 
             if segment_duration is None:
                 self.logger.error(f"No segment duration available for segment {segment_id}")
@@ -430,60 +848,18 @@ class BRollFetcher:
                 broll_clips = self._expand_search_queries(broll_clips, num_clips_needed)
 
             os.makedirs(output_dir, exist_ok=True)
-            success_count = 0
-
-            for idx, clip in enumerate(broll_clips[:num_clips_needed]):
-                clip_type = clip.get('type', 'video')
-                search_query = clip.get('search_query', '')
-
-                if not search_query:
-                    self.logger.warning(f"Clip {idx} has no search_query, skipping")
-                    continue
-
-                # Search with fallback, use idx to get different results
-                media_item = self._search_with_fallback(search_query, clip_type, result_index=idx)
-
-                if not media_item:
-                    self.logger.error(f"No results found for '{search_query}'")
-                    continue
-
-                download_url = self._get_download_url(media_item, clip_type)
-                if not download_url:
-                    self.logger.error(f"Could not extract download URL for '{search_query}'")
-                    continue
 
-                if clip_type == 'video':
-                    # Download video
-                    temp_file = os.path.join(output_dir, f"segment_{segment_id:03d}_clip_{idx:03d}_temp.mp4")
-                    if not self.download_media(download_url, temp_file):
-                        continue
+            broll_clips = broll_clips[:num_clips_needed]
+            search_results = self._search_all(broll_clips)
 
-                    # Apply random speed factor for more dynamic feel
-                    speed_factor = random.uniform(speed_range[0], speed_range[1])
-
-                    output_file = os.path.join(output_dir, f"segment_{segment_id:03d}_clip_{idx:03d}.mp4")
-                    if self.process_video(temp_file, output_file, resolution, clip_display_duration, speed_factor):
-                        success_count += 1
-                        os.remove(temp_file)
-                    else:
-                        self.logger.error(f"Failed to process video clip {idx}")
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
-
-                else:  # image
-                    temp_file = os.path.join(output_dir, f"segment_{segment_id:03d}_clip_{idx:03d}_temp.jpg")
-                    if not self.download_media(download_url, temp_file):
-                        continue
-
-                    # Output as .mp4 (still frame converted to video) so assembler can concatenate
-                    output_file = os.path.join(output_dir, f"segment_{segment_id:03d}_clip_{idx:03d}.mp4")
-                    if self.process_image(temp_file, output_file, resolution, clip_display_duration):
-                        success_count += 1
-                        os.remove(temp_file)
-                    else:
-                        self.logger.error(f"Failed to process image clip {idx}")
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
+            # Clips are independent: overlap their downloads and ffmpeg encodes
+            with ThreadPoolExecutor(max_workers=min(len(broll_clips), CLIP_WORKERS)) as executor:
+                results = list(executor.map(
+                    lambda job: self._fetch_one_clip(segment_id, job[0], job[1], output_dir, resolution,
+                                                     clip_display_duration, speed_range, search_results),
+                    enumerate(broll_clips)
+                ))
+            success_count = sum(results)
 
             self.logger.info(f"B-roll fetch complete: {success_count}/{num_clips_needed} clips for segment {segment_id}")
             return success_count > 0
@@ -493,7 +869,54 @@ class BRollFetcher:
             return False
 
 
-def main():
+# Per-process fetcher and config for --segment-ids / --all workers
+_worker_fetcher: Optional[BRollFetcher] = None
+_worker_config: Optional[Dict] = None
+
+
+def _init_segment_worker(api_keys: Dict[str, str], config: Dict, log_file: Optional[str], encode_workers: int):
+    global _worker_fetcher, _worker_config
+    _worker_fetcher = BRollFetcher(api_keys, log_file=log_file, encode_workers=encode_workers)
+    _worker_config = config
+    # Pool workers leave through os._exit, which skips atexit; multiprocessing
+    # finalizers still run on the way out
+    multiprocessing.util.Finalize(None, _worker_fetcher.close, exitpriority=10)
+
+
+def _fetch_segment_worker(job: Tuple) -> bool:
+    segment_id, output_dir, resolution, segment_duration, audio_dir, cut_frequency, speed_range = job
+    return _worker_fetcher.fetch_for_segment(
+        _worker_config, segment_id, output_dir, resolution,
+        segment_duration=segment_duration,
+        audio_dir=audio_dir,
+        cut_frequency=cut_frequency,
+        speed_range=speed_range
+    )
+
+
+def fetch_segments_parallel(api_keys: Dict[str, str], config: Dict, segment_ids: List[int], output_dir: str,
+                            resolution: Tuple[int, int], durations: Dict[int, float],
+                            audio_dir: Optional[str] = None, cut_frequency: float = 2.5,
+                            speed_range: Tuple[float, float] = (1.2, 2.0),
+                            log_file: Optional[str] = None) -> int:
+    """Fetch b-roll for several segments, one worker process per core. Returns the number that succeeded.
+
+    Each process builds its BRollFetcher once; they share the on-disk search cache
+    and split the cores between their encodes.
+    """
+    jobs = [
+        (segment_id, output_dir, resolution, durations.get(segment_id), audio_dir, cut_frequency, speed_range)
+        for segment_id in segment_ids
+    ]
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, min(len(jobs), cpu_count))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_segment_worker,
+                             initargs=(api_keys, config, log_file,
+                                       max(1, cpu_count // (workers * ENCODE_THREADS)))) as executor:
+        return sum(executor.map(_fetch_segment_worker, jobs))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(description="Fetch and process b-roll footage")
 
     # Mode selection
@@ -503,6 +926,12 @@ def main():
 
     # Common arguments
     parser.add_argument('--segment-id', type=int, help='Segment ID to fetch (required for --json)')
+    parser.add_argument('--segment-ids', type=str,
+                        help='Comma-separated segment IDs to fetch in parallel (instead of --segment-id)')
+    parser.add_argument('--all', action='store_true',
+                        help='Fetch every segment in the JSON in parallel (instead of --segment-id)')
+    parser.add_argument('--timestamps', type=str,
+                        help='audio_timestamps.json giving segment durations for --segment-ids / --all')
     parser.add_argument('--output-dir', type=str, required=True, help='Output directory')
     parser.add_argument('--resolution', type=str, default='1080x1920', help='Target resolution (WxH)')
     parser.add_argument('--type', type=str, choices=['video', 'image'], default='video',
@@ -523,12 +952,25 @@ def main():
                         help='Minimum speed factor for clips (default: 1.2)')
     parser.add_argument('--speed-max', type=float, default=2.0,
                         help='Maximum speed factor for clips (default: 2.0)')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Only run API searches for the segment to warm the cache (for --json mode)')
+    parser.add_argument('--encode-workers', type=int,
+                        help='Concurrent ffmpeg encodes (default: cores / threads per encode); '
+                             'lower it when several fetchers share the machine')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Validate arguments
-    if args.json and not args.segment_id:
-        parser.error("--json requires --segment-id")
+    multi_segment = bool(args.segment_ids or args.all)
+    if args.json and args.segment_id is None and not multi_segment:
+        parser.error("--json requires --segment-id, --segment-ids or --all")
+    if multi_segment:
+        multi_flag = '--all' if args.all else '--segment-ids'
+        if args.prefetch:
+            parser.error(f"--prefetch takes a single --segment-id, not {multi_flag}")
+        if args.segment_duration is not None:
+            parser.error(f"{multi_flag} takes durations from --timestamps or --audio-dir, "
+                         f"not --segment-duration")
 
     # Parse resolution
     try:
@@ -536,70 +978,100 @@ def main():
         resolution = (width, height)
     except:
         print(f"Error: Invalid resolution format: {args.resolution}", file=sys.stderr)
-        sys.exit(1)
+        return 1
 
     try:
         # Load API keys
         if not os.path.exists(args.api_keys):
             print(f"Error: API keys file not found: {args.api_keys}", file=sys.stderr)
             print("Copy config/api_keys.json.example to config/api_keys.json and add your keys")
-            sys.exit(1)
+            return 1
 
         with open(args.api_keys, 'r') as f:
             api_keys = json.load(f)
 
-        # Initialize fetcher
-        fetcher = BRollFetcher(api_keys, log_file=args.log_file)
-
-        # Process based on mode
-        if args.json:
-            # Helper script mode
+        if args.json and multi_segment:
             with open(args.json, 'r', encoding='utf-8') as f:
                 config = json.load(f)
 
-            success = fetcher.fetch_for_segment(
-                config, args.segment_id, args.output_dir, resolution,
-                segment_duration=args.segment_duration,
+            if args.all:
+                segment_ids = [s['segment_id'] for s in config.get('script_segments', [])]
+            else:
+                segment_ids = [int(i) for i in args.segment_ids.split(',') if i.strip()]
+
+            durations = {}
+            if args.timestamps:
+                with open(args.timestamps, 'r', encoding='utf-8') as f:
+                    durations = {s['segment_id']: s['duration'] for s in json.load(f).get('segments', [])}
+
+            succeeded = fetch_segments_parallel(
+                api_keys, config, segment_ids, args.output_dir, resolution, durations,
                 audio_dir=args.audio_dir,
                 cut_frequency=args.cut_frequency,
-                speed_range=(args.speed_min, args.speed_max)
+                speed_range=(args.speed_min, args.speed_max),
+                log_file=args.log_file
             )
-        else:
-            # Standalone mode
-            results = fetcher.search_pexels(args.query, args.type)
-            if not results:
-                results = fetcher.search_pixabay(args.query, args.type)
-
-            if not results:
-                print(f"No results found for '{args.query}'", file=sys.stderr)
-                sys.exit(1)
-
-            media_item = results[0]
-            success = False
-
-            download_url = fetcher._get_download_url(media_item, args.type)
-            if download_url:
-                if args.type == 'video':
-                    temp_file = os.path.join(args.output_dir, "temp_video.mp4")
-                    output_file = os.path.join(args.output_dir, "output_video.mp4")
-                    if fetcher.download_media(download_url, temp_file):
-                        success = fetcher.process_video(temp_file, output_file, resolution, args.duration)
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
-                else:
-                    temp_file = os.path.join(args.output_dir, "temp_image.jpg")
-                    output_file = os.path.join(args.output_dir, "output_image.jpg")
-                    if fetcher.download_media(download_url, temp_file):
-                        success = fetcher.process_image(temp_file, output_file, resolution)
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
-
-        sys.exit(0 if success else 1)
+            print(f"B-roll fetched for {succeeded}/{len(segment_ids)} segments")
+            return 0 if succeeded == len(segment_ids) else 1
+
+        # Initialize fetcher
+        fetcher = BRollFetcher(api_keys, log_file=args.log_file, encode_workers=args.encode_workers)
+        try:
+            # Process based on mode
+            if args.json:
+                # Helper script mode
+                with open(args.json, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+
+                if args.prefetch:
+                    success = fetcher.prefetch_for_segment(config, args.segment_id)
+                    return 0 if success else 1
+
+                success = fetcher.fetch_for_segment(
+                    config, args.segment_id, args.output_dir, resolution,
+                    segment_duration=args.segment_duration,
+                    audio_dir=args.audio_dir,
+                    cut_frequency=args.cut_frequency,
+                    speed_range=(args.speed_min, args.speed_max)
+                )
+            else:
+                # Standalone mode
+                results = fetcher.search_pexels(args.query, args.type)
+                if not results:
+                    results = fetcher.search_pixabay(args.query, args.type)
+
+                if not results:
+                    print(f"No results found for '{args.query}'", file=sys.stderr)
+                    return 1
+
+                media_item = results[0]
+                success = False
+
+                download_url = fetcher._get_download_url(media_item, args.type)
+                if download_url:
+                    if args.type == 'video':
+                        temp_file = os.path.join(args.output_dir, "temp_video.mp4")
+                        output_file = os.path.join(args.output_dir, "output_video.mp4")
+                        if fetcher.download_media(download_url, temp_file):
+                            success = fetcher.process_video(temp_file, output_file, resolution, args.duration)
+                            if os.path.exists(temp_file):
+                                os.remove(temp_file)
+                    else:
+                        temp_file = os.path.join(args.output_dir, "temp_image.jpg")
+                        output_file = os.path.join(args.output_dir, "output_image.jpg")
+                        if fetcher.download_media(download_url, temp_file):
+                            success = fetcher.process_image(temp_file, output_file, resolution)
+                            if os.path.exists(temp_file):
+                                os.remove(temp_file)
+
+            return 0 if success else 1
+        finally:
+            fetcher.close()
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        return 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Fast JSON
+JSON parsing and serialization shared by the pipeline scripts. orjson is several
+times faster on the word timestamps and configs; without it the stdlib json is
+used, with the same bytes-in / UTF-8-bytes-out interface.
+"""
+
+import json
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+
+    def json_dumps(obj) -> bytes:
+        """Serialize to indented UTF-8 JSON bytes."""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj) -> bytes:
+        """Serialize to indented UTF-8 JSON bytes."""
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
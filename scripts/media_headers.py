@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Media Headers
+Reads durations and dimensions straight from MP4 boxes and WAV RIFF chunks, so
+callers can skip an ffprobe subprocess. Readers return None when the header isn't
+there or can't be parsed (fall back to ffprobe then) and raise OSError if the file
+can't be read.
+"""
+
+import os
+import struct
+from typing import Iterator, Optional, Tuple
+
+
+def iter_mp4_boxes(f, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Walk sibling MP4 boxes in [start, end), yielding (type, payload_start, box_end).
+
+    Stops at a truncated or malformed header.
+    """
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack('>I4s', header)
+        header_len = 8
+        if size == 1:  # 64-bit size follows the type
+            large = f.read(8)
+            if len(large) < 8:
+                return
+            size = struct.unpack('>Q', large)[0]
+            header_len = 16
+        elif size == 0:  # Box extends to end of file
+            size = end - pos
+        if size < header_len:
+            return
+        yield kind, pos + header_len, pos + size
+        pos += size
+
+
+def find_mp4_box(f, box_type: bytes, start: int, end: int) -> Optional[Tuple[int, int]]:
+    """First box of box_type among the siblings in [start, end), as (payload_start, box_end)."""
+    return next(((payload, box_end) for kind, payload, box_end in iter_mp4_boxes(f, start, end)
+                 if kind == box_type), None)
+
+
+def read_mp4_duration(video_path: str) -> Optional[float]:
+    """Read duration from the moov/mvhd header (a few small reads, no ffprobe)."""
+    with open(video_path, 'rb') as f:
+        moov = find_mp4_box(f, b'moov', 0, os.fstat(f.fileno()).st_size)
+        if moov is None:
+            return None
+        mvhd = find_mp4_box(f, b'mvhd', *moov)
+        if mvhd is None:
+            return None
+
+        f.seek(mvhd[0])
+        if f.read(4)[:1] == b'\x01':
+            # creation(8) modification(8) timescale(4) duration(8)
+            data = f.read(28)
+            fmt = '>16xIQ'
+        else:
+            # creation(4) modification(4) timescale(4) duration(4)
+            data = f.read(16)
+            fmt = '>8xII'
+        if len(data) < struct.calcsize(fmt):
+            return None
+
+        timescale, duration = struct.unpack(fmt, data)
+        if not timescale:
+            return None
+        return duration / timescale
+
+
+def read_mp4_dimensions(video_path: str) -> Optional[Tuple[int, int]]:
+    """Width/height of the first video track, from its moov/trak/tkhd header."""
+    with open(video_path, 'rb') as f:
+        moov = find_mp4_box(f, b'moov', 0, os.fstat(f.fileno()).st_size)
+        if moov is None:
+            return None
+
+        for kind, trak_start, trak_end in iter_mp4_boxes(f, *moov):
+            if kind != b'trak':
+                continue
+            tkhd = find_mp4_box(f, b'tkhd', trak_start, trak_end)
+            if tkhd is None:
+                continue
+
+            # 16.16 fixed-point width/height after the version 0/1 time fields and matrix
+            f.seek(tkhd[0])
+            offset = 88 if f.read(1) == b'\x01' else 76
+            f.seek(tkhd[0] + offset)
+            data = f.read(8)
+            if len(data) < 8:
+                return None
+            width, height = struct.unpack('>II', data)
+            if width and height:  # Audio tracks have no size
+                return width >> 16, height >> 16
+    return None
+
+
+def read_wav_duration(wav_path: str) -> Optional[float]:
+    """Duration of a WAV file from its RIFF header (data size / byte rate)."""
+    with open(wav_path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:] != b'WAVE':
+            return None
+
+        byte_rate = 0
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'fmt ':
+                fmt = f.read(size)
+                if len(fmt) < 12:
+                    return None
+                byte_rate = struct.unpack('<I', fmt[8:12])[0]
+                f.seek(size & 1, 1)
+            elif chunk_id == b'data':
+                # Streaming writers may leave the size at 0xFFFFFFFF: bound it by the file
+                size = min(size, os.fstat(f.fileno()).st_size - f.tell())
+                return size / byte_rate if byte_rate else None
+            else:
+                f.seek(size + (size & 1), 1)
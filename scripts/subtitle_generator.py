@@ -6,7 +6,6 @@ Words appear one at a time, current word highlighted, resets after N words.
 """
 
 import argparse
-import json
 import logging
 import os
 import sys
@@ -23,6 +22,8 @@ except ImportError as e:
     print("Install with: pip install faster-whisper ffmpeg-python pysubs2")
     sys.exit(1)
 
+from fast_json import json_loads
+
 
 class SubtitleGenerator:
     def __init__(self, model_size: str = "base", device: str = "cuda", log_file: Optional[str] = None):
@@ -314,24 +315,23 @@ class SubtitleGenerator:
         try:
             self.logger.info(f"Creating SRT file: {output_path}")
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                subtitle_index = 1
-                i = 0
-                while i < len(word_segments):
-                    chunk = word_segments[i:i + words_per_subtitle]
-                    if not chunk:
-                        break
+            # Build every cue first, then write the file in one call
+            cues = []
+            for subtitle_index, i in enumerate(range(0, len(word_segments), words_per_subtitle), start=1):
+                chunk = word_segments[i:i + words_per_subtitle]
 
-                    start_time = chunk[0]['start']
-                    end_time = chunk[-1]['end']
-                    text = ' '.join([w['word'] for w in chunk])
+                start_time = chunk[0]['start']
+                end_time = chunk[-1]['end']
+                text = ' '.join([w['word'] for w in chunk])
 
-                    f.write(f"{subtitle_index}\n")
-                    f.write(f"{self._format_timestamp(start_time)} --> {self._format_timestamp(end_time)}\n")
-                    f.write(f"{text}\n\n")
+                cues.append(
+                    f"{subtitle_index}\n"
+                    f"{self._format_timestamp(start_time)} --> {self._format_timestamp(end_time)}\n"
+                    f"{text}\n\n"
+                )
 
-                    subtitle_index += 1
-                    i += words_per_subtitle
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(cues))
 
             self.logger.info(f"SRT file created: {output_path}")
             return True
@@ -349,7 +349,7 @@ class SubtitleGenerator:
         return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
 
 
-def main():
+def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(description="Generate and overlay animated subtitles")
 
     # Mode selection
@@ -375,7 +375,7 @@ def main():
     parser.add_argument('--timestamps-json', type=str,
                         help='Path to audio_timestamps.json (skip transcription, use pre-computed timestamps)')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Validate arguments
     if args.audio_dir and not (args.video_dir and args.output_dir):
@@ -389,8 +389,8 @@ def main():
         settings = None
         settings_path = Path("config/settings.json")
         if settings_path.exists():
-            with open(settings_path, 'r') as f:
-                all_settings = json.load(f)
+            with open(settings_path, 'rb') as f:
+                all_settings = json_loads(f.read())
             settings = all_settings.get('subtitle_animation', None)
 
         # Initialize subtitle generator
@@ -403,8 +403,8 @@ def main():
         # Load pre-computed word timestamps if provided
         word_segments = None
         if args.timestamps_json:
-            with open(args.timestamps_json, 'r', encoding='utf-8') as f:
-                timestamps_data = json.load(f)
+            with open(args.timestamps_json, 'rb') as f:
+                timestamps_data = json_loads(f.read())
             word_segments = timestamps_data.get('words', [])
             if word_segments:
                 print(f"Loaded {len(word_segments)} pre-computed word timestamps")
@@ -436,12 +436,12 @@ def main():
             success = False
             print("Legacy --audio-dir mode is deprecated. Use --video with --timestamps-json instead.")
 
-        sys.exit(0 if success else 1)
+        return 0 if success else 1
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        return 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -182,11 +182,11 @@ def main():
     # Package checks
     print("\n[PYTHON PACKAGES]")
     results['requests'] = check_package('requests')
-    results['pillow'] = check_package('pillow', 'PIL')
     results['pydub'] = check_package('pydub')
     results['ffmpeg-python'] = check_package('ffmpeg-python', 'ffmpeg')
     results['faster-whisper'] = check_package('faster-whisper', 'faster_whisper')
     results['kokoro'] = check_package('kokoro')
+    results['fastjsonschema'] = check_package('fastjsonschema')
 
     # Optional checks
     print("\n[OPTIONAL FEATURES]")
@@ -218,11 +218,11 @@ def main():
 
     packages_passed = all([
         results['requests'],
-        results['pillow'],
         results['pydub'],
         results['ffmpeg-python'],
         results['faster-whisper'],
-        results['kokoro']
+        results['kokoro'],
+        results['fastjsonschema']
     ])
 
     if critical_passed and packages_passed:
@@ -6,7 +6,6 @@ V2: Works with single full audio and timestamps-based assembly.
 """
 
 import argparse
-import json
 import logging
 import os
 import sys
@@ -22,6 +21,9 @@ except ImportError as e:
     print("Install with: pip install ffmpeg-python pydub")
     sys.exit(1)
 
+from fast_json import json_loads
+from media_headers import read_mp4_duration
+
 
 PLATFORM_RESOLUTIONS = {
     "youtube_shorts": {"width": 1080, "height": 1920, "aspect": "9:16"},
@@ -65,7 +67,14 @@ class VideoAssembler:
             return 0.0
 
     def get_video_duration(self, video_path: str) -> float:
-        """Get duration of video file in seconds."""
+        """Get duration of video file in seconds (MP4 header first, then ffprobe)."""
+        try:
+            duration = read_mp4_duration(video_path)
+            if duration is not None:
+                return duration
+        except OSError:
+            pass
+
         try:
             probe = ffmpeg.probe(video_path)
             duration = float(probe['format']['duration'])
@@ -79,20 +88,18 @@ class VideoAssembler:
         try:
             self.logger.info(f"Concatenating {len(clip_paths)} clips")
 
-            # Create concat file list
-            concat_file = output_path.replace('.mp4', '_concat.txt')
-            with open(concat_file, 'w') as f:
-                for clip in clip_paths:
-                    # Convert to absolute path for ffmpeg
-                    abs_path = os.path.abspath(clip).replace('\\', '/')
-                    f.write(f"file '{abs_path}'\n")
+            # Build concat list in memory and feed it on stdin (no temp list file);
+            # absolute paths since the list has no directory of its own
+            abs_paths = (os.path.abspath(clip).replace('\\', '/') for clip in clip_paths)
+            concat_list = ''.join(f"file '{path}'\n" for path in abs_paths)
 
             # Run ffmpeg concat with re-encoding for better compatibility
             cmd = [
                 'ffmpeg',
                 '-f', 'concat',
                 '-safe', '0',
-                '-i', concat_file,
+                '-protocol_whitelist', 'file,pipe',
+                '-i', 'pipe:0',
                 '-c:v', 'libx264',
                 '-preset', 'medium',
                 '-crf', '23',
@@ -108,16 +115,12 @@ class VideoAssembler:
             cmd.extend(['-y', output_path])
 
             import subprocess
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = subprocess.run(cmd, input=concat_list, capture_output=True, text=True)
 
             if result.returncode != 0:
                 self.logger.error(f"FFmpeg concat error: {result.stderr}")
                 return False
 
-            # Cleanup concat file
-            if os.path.exists(concat_file):
-                os.remove(concat_file)
-
             self.logger.info(f"Clips concatenated: {output_path}")
             return True
 
@@ -277,8 +280,8 @@ class VideoAssembler:
         """
         try:
             # Load configuration
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+            with open(config_path, 'rb') as f:
+                config = json_loads(f.read())
 
             video_name = config.get('video_name', 'output')
             target_platform = config.get('target_platform', 'youtube_shorts')
@@ -316,14 +319,18 @@ class VideoAssembler:
         """V2 assembly: single audio + all b-roll clips concatenated globally."""
         try:
             # Load timestamps
-            with open(timestamps_path, 'r', encoding='utf-8') as f:
-                timestamps = json.load(f)
+            with open(timestamps_path, 'rb') as f:
+                timestamps = json_loads(f.read())
 
             # Step 1: Collect ALL b-roll clips across all segments in order
             self.logger.info("Collecting all b-roll clips...")
             all_clips = []
             for seg_timing in timestamps['segments']:
                 seg_id = seg_timing['segment_id']
+                if seg_timing['duration'] <= 0:
+                    # Wordless segment (empty word range): nothing to cover
+                    self.logger.info(f"Segment {seg_id}: no audio, skipped")
+                    continue
                 seg_clips = sorted(broll_dir.glob(f"segment_{seg_id:03d}_clip_*.mp4"))
                 all_clips.extend([str(c) for c in seg_clips])
                 self.logger.info(f"Segment {seg_id}: {len(seg_clips)} clips")
@@ -526,7 +533,7 @@ class VideoAssembler:
                 pass
 
 
-def main():
+def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(description="Assemble final video from components")
 
     parser.add_argument('--json', type=str, required=True, help='Path to JSON configuration file')
@@ -540,7 +547,7 @@ def main():
     parser.add_argument('--timestamps-json', type=str,
                         help='Path to audio_timestamps.json for v2 assembly')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     try:
         # Initialize assembler
@@ -552,12 +559,12 @@ def main():
             timestamps_path=args.timestamps_json
         )
 
-        sys.exit(0 if success else 1)
+        return 0 if success else 1
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        return 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())